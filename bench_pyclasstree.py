@@ -0,0 +1,370 @@
+"""Benchmarks of the pyclasstree hot paths.
+
+Every target is a class hierarchy, synthetic or real, and every stage of the
+pipeline is timed on it: discovery, row computation, inspection, layout, node
+and line creation and a drag of the most connected node. Without a display the
+window is drawn on a NullCanvas, which only counts the canvas calls.
+
+    python bench_pyclasstree.py -o results.json
+    python bench_pyclasstree.py --baseline baseline.json --update-baseline
+    python bench_pyclasstree.py --baseline baseline.json    # exit status 1 on regressions
+"""
+import sys
+import json
+import platform
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from statistics import median
+from time import perf_counter
+from tkinter import Tk, TclError
+
+import pyclasstree
+from pyclasstree import (CustomCanvas, LayeredLayout, MainWindow, all_paths, class_depths,
+                         find_all_classes, inspect_class_tree, ClassTree)
+
+
+################################################################################
+# SYNTHETIC HIERARCHIES:
+################################################################################
+def deep_chain(depth=400):
+    """A single line of inheritance depth classes long."""
+    classes = [type('Chain0', (), {})]
+    for i in range(1, depth):
+        classes.append(type(f'Chain{i}', (classes[-1],), {}))
+    return classes
+
+
+def wide_fanout(width=12, levels=3):
+    """Every class has width subclasses, levels deep."""
+    root = type('Fan', (), {})
+    classes, level = [root], [root]
+    for depth in range(levels):
+        level = [type(f'Fan{depth}_{i}_{j}', (cls,), {}) for i, cls in enumerate(level) for j in range(width)]
+        classes.extend(level)
+    return classes
+
+
+def diamond_lattice(width=30, depth=20):
+    """Rows of width classes, each class inherits from two neighbours of the row above."""
+    root = type('Lattice', (), {})
+    classes, level = [root], [root] * width
+    for row in range(depth):
+        bases = [(level[i], level[i + 1]) if i + 1 < width and level[i] is not level[i + 1] else (level[i],)
+                 for i in range(width)]
+        level = []
+        for i, pair in enumerate(bases):
+            try:
+                level.append(type(f'Lattice{row}_{i}', pair, {}))
+            except TypeError:    # no consistent MRO
+                level.append(type(f'Lattice{row}_{i}', pair[:1], {}))
+        classes.extend(level)
+    return classes
+
+
+def metaclass_heavy(metaclasses=40, per_metaclass=12):
+    """Chains of metaclasses, every metaclass has its own classes."""
+    root = type('Plugin', (), {})
+    classes = [root]
+    meta = type
+    for i in range(metaclasses):
+        meta = type(f'Meta{i}', (meta,), {})
+        classes.append(meta)
+        base = meta(f'Plugin{i}', (root,), {})
+        classes.append(base)
+        classes.extend(meta(f'Plugin{i}_{j}', (base,), {}) for j in range(per_metaclass))
+    return classes
+
+
+def real_target(module_name, name):
+    def target():
+        module = __import__(module_name, fromlist=[name])
+        return [getattr(module, name)]
+    return target
+
+
+# name: (generator, run all_paths) - all_paths is exponential on lattices
+TARGETS = {
+    'deep_chain': (deep_chain, True),
+    'wide_fanout': (wide_fanout, True),
+    'diamond_lattice': (diamond_lattice, False),
+    'metaclass_heavy': (metaclass_heavy, True),
+    'Exception': (real_target('builtins', 'Exception'), True),
+    'tkinter.Frame': (real_target('tkinter', 'Frame'), True),
+    'collections.abc': (real_target('collections.abc', 'Iterable'), True),
+}
+
+
+################################################################################
+# HEADLESS DRAWING:
+################################################################################
+class NullCanvas:
+    """Takes the canvas calls of MainWindow, Node and Line without Tk and counts them."""
+    create_circle = CustomCanvas.create_circle
+    round_rectangle_points = staticmethod(CustomCanvas.round_rectangle_points)
+
+    def __init__(self):
+        self.calls = 0
+        self.last_id = 0
+
+    def create_item(self, *args, **kwargs):
+        self.calls += 1
+        self.last_id += 1
+        return self.last_id
+
+    create_polygon = create_text = create_oval = create_line = create_item
+
+    def create_batch(self, count):
+        self.calls += 1
+        self.last_id += count
+        return list(range(self.last_id - count + 1, self.last_id + 1))
+
+    def create_nodes_batch(self, nodes, *args):
+        return self.create_batch(len(nodes) // 10 * 4)
+
+    def create_lines_batch(self, lines, *args):
+        return self.create_batch(len(lines) // 3)
+
+    def call(self, *args, **kwargs):
+        self.calls += 1
+
+    coords = itemconfigure = move = tkraise = tag_bind = tag_lower = scale = call
+    config = addtag_all = bind = pack = delete = xview_moveto = yview_moveto = call
+
+    def canvasx(self, x):
+        return x
+
+    def canvasy(self, y):
+        return y
+
+    def winfo_width(self):
+        return 1000
+
+    def winfo_height(self):
+        return 800
+
+
+class HeadlessRoot:
+    def winfo_screenwidth(self):
+        return 1920
+
+    def winfo_screenheight(self):
+        return 1080
+
+
+class BenchWindow(MainWindow):
+    """MainWindow which times create_nodes, create_all_lines and the steps of the first drawing."""
+    def create_nodes(self):
+        start = perf_counter()
+        MainWindow.create_nodes(self)
+        self.timings = {'create_nodes': perf_counter() - start, 'build': 0.0}
+
+    def create_all_lines(self):
+        start = perf_counter()
+        MainWindow.create_all_lines(self)
+        self.timings['create_all_lines'] = perf_counter() - start
+
+    def build_step(self):
+        start = perf_counter()
+        MainWindow.build_step(self)
+        self.timings['build'] += perf_counter() - start
+
+    def run_pending(self):
+        self.update()
+
+
+class HeadlessWindow(BenchWindow):
+    """BenchWindow drawn on a NullCanvas, after() callbacks run from run_pending()."""
+    def create_widgets(self):
+        self.canvas = NullCanvas()
+        self.pending = {}
+        self.after_num = 0
+
+    def after(self, ms, func=None, *args):
+        self.after_num += 1
+        self.pending[self.after_num] = func
+        return self.after_num
+
+    def after_idle(self, func, *args):
+        return self.after(0, func)
+
+    def after_cancel(self, after_id):
+        self.pending.pop(after_id, None)
+
+    def run_pending(self):
+        while self.pending:
+            after_id = next(iter(self.pending))
+            self.pending.pop(after_id)()
+
+
+class MotionEvent:
+    def __init__(self, widget, x, y):
+        self.widget = widget
+        self.x = x
+        self.y = y
+
+
+def make_window(tree, root):
+    if root is None:
+        window = HeadlessWindow(tree, parent=HeadlessRoot())
+    else:
+        window = BenchWindow(tree, parent=root)
+    window.run_pending()
+    while window.build_queue is not None:    # a big tree is drawn in several steps
+        window.run_pending()
+    return window
+
+
+def drag(window, steps=50):
+    """Drag the node with the most lines like a mouse would, return the canvas calls made."""
+    node = max(window.nodes.values(), key=lambda node: len(node.lines))
+    node.materialize()
+    canvas = window.canvas
+    calls = getattr(canvas, 'calls', 0)
+    node.select_node(MotionEvent(canvas, 0, 0))
+    for step in range(1, steps + 1):
+        node.move_node(MotionEvent(canvas, step * 3, step * 2))
+        window.run_pending()
+    node.unselect_node(MotionEvent(canvas, steps * 3, steps * 2))
+    window.run_pending()
+    return getattr(canvas, 'calls', 0) - calls
+
+
+################################################################################
+# RUNNING AND COMPARING:
+################################################################################
+def timed(func, *args):
+    start = perf_counter()
+    result = func(*args)
+    return perf_counter() - start, result
+
+
+def bench_target(name, generator, with_paths, root, repeat):
+    """Return {stage: [seconds, ...]} and extra counters of one target."""
+    classes = generator()
+    start = classes[0]
+    times = {}
+    counters = {}
+    for _ in range(repeat):
+        seconds, found = timed(find_all_classes, start)
+        times.setdefault('find_all_classes', []).append(seconds)
+        seconds, depths = timed(class_depths, found)
+        times.setdefault('class_depths', []).append(seconds)
+        if with_paths:
+            seconds, paths = timed(lambda: [all_paths(cls) for cls in found if cls is not type])
+            times.setdefault('all_paths', []).append(seconds)
+        seconds, tree_dict = timed(inspect_class_tree, found)
+        times.setdefault('inspect_class_tree', []).append(seconds)
+        seconds, positions = timed(LayeredLayout(), tree_dict)
+        times.setdefault('layout', []).append(seconds)
+
+        tree = ClassTree(start)
+        seconds, window = timed(make_window, tree, root)
+        times.setdefault('window', []).append(seconds)
+        for stage in ('create_nodes', 'create_all_lines', 'build'):
+            times.setdefault(stage, []).append(window.timings[stage])
+        seconds, calls = timed(drag, window)
+        times.setdefault('drag', []).append(seconds)
+        counters = {'classes': len(found), 'nodes': len(window.nodes),
+                    'lines': len(window.edges), 'drag_canvas_calls': calls}
+        if root is not None:
+            window.destroy()
+    return times, counters
+
+
+def run(names, repeat=5):
+    try:
+        root = Tk()
+        root.withdraw()
+        backend = 'tk'
+    except TclError:
+        root = None
+        backend = 'headless'
+    results = {}
+    for name in names:
+        generator, with_paths = TARGETS[name]
+        times, counters = bench_target(name, generator, with_paths, root, repeat)
+        for stage, samples in times.items():
+            results[f'{name}/{stage}'] = {'min': min(samples), 'median': median(samples), 'runs': len(samples)}
+        results[f'{name}/counters'] = counters
+    if root is not None:
+        root.destroy()
+    return {'meta': {'python': platform.python_version(),
+                     'implementation': platform.python_implementation(),
+                     'machine': platform.machine(),
+                     'numpy': pyclasstree.numpy is not None,
+                     'backend': backend,
+                     'date': datetime.now(timezone.utc).isoformat(timespec='seconds')},
+            'results': results}
+
+
+def compare(current, baseline, tolerance, min_delta=0.0005):
+    """Return the list of (key, baseline min, current min) which got slower than tolerance allows.
+
+    Differences below min_delta seconds are timer noise and never count.
+    """
+    regressions = []
+    for key, result in current['results'].items():
+        old = baseline['results'].get(key)
+        if old is None or 'min' not in result:
+            continue
+        if result['min'] > old['min'] * (1 + tolerance) and result['min'] - old['min'] > min_delta:
+            regressions.append((key, old['min'], result['min']))
+    return regressions
+
+
+def report(current, baseline=None, fp=sys.stdout):
+    meta = current['meta']
+    fp.write(f"python {meta['python']} ({meta['implementation']}), {meta['backend']} canvas, "
+             f"numpy: {meta['numpy']}\n")
+    fp.write(f"{'benchmark':<45}{'min ms':>10}{'median ms':>12}{'baseline':>11}\n")
+    for key, result in current['results'].items():
+        if 'min' not in result:
+            fp.write(f'{key:<45}{json.dumps(result)}\n')
+            continue
+        line = f"{key:<45}{result['min'] * 1000:>10.2f}{result['median'] * 1000:>12.2f}"
+        old = baseline and baseline['results'].get(key)
+        if old and old.get('min'):
+            line += f"{result['min'] / old['min']:>10.2f}x"
+        fp.write(line + '\n')
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='Time the pyclasstree pipeline on synthetic and real class trees.')
+    parser.add_argument('-k', '--select', action='append',
+                        help='run only targets whose name contains this substring')
+    parser.add_argument('-n', '--repeat', type=int, default=5)
+    parser.add_argument('-o', '--output', help='write the results as JSON to this file')
+    parser.add_argument('-b', '--baseline', help='JSON results to compare with')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write the results to the --baseline file instead of comparing')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown against the baseline, 0.25 means 25%%')
+    parser.add_argument('--min-delta', type=float, default=0.5,
+                        help='slowdowns smaller than this many milliseconds are ignored')
+    args = parser.parse_args(argv)
+
+    names = [name for name in TARGETS if not args.select or any(part in name for part in args.select)]
+    current = run(names, repeat=args.repeat)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(current, fp, indent=1)
+
+    baseline = None
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as fp:
+            json.dump(current, fp, indent=1)
+    elif args.baseline:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+    report(current, baseline)
+
+    if baseline is not None:
+        regressions = compare(current, baseline, args.tolerance, args.min_delta / 1000)
+        for key, old, new in regressions:
+            print(f'REGRESSION {key}: {old * 1000:.2f} ms -> {new * 1000:.2f} ms')
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
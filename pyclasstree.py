@@ -1,14 +1,107 @@
+import os
 import sys
-from inspect import isfunction, isclass
+import ast
+import builtins
+import json
+import threading
+import zlib
+from argparse import ArgumentParser
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from hashlib import blake2b
+from heapq import nsmallest
+from html import escape
+from importlib import import_module
+from importlib.util import find_spec
+from inspect import isfunction, isclass, isroutine
+from operator import attrgetter
+from queue import Queue, Empty
 from tkinter import *
 from tkinter.colorchooser import askcolor
 from math import asin, pi, log, ceil
+from time import perf_counter
+from types import GetSetDescriptorType, MemberDescriptorType
+from weakref import WeakKeyDictionary, WeakValueDictionary, ref
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 RADIUS = 4
+NODE_WIDTH = 200
+NODE_HEIGHT = 50
+VIRTUAL_NODES = 500    # bigger trees are drawn in a virtual window by default
+CULL_MARGIN = 300    # pixels around the view where a virtual window keeps items
+MEMBER_CACHE = 64    # classes whose members are kept for the inspector panel
+BUILD_CHUNK = 2000    # nodes and lines drawn by one step of the first drawing
+LOAD_POLL_MS = 50    # how often a window asks its TreeLoader for new records, at least
+BUNDLE_MIN = 8    # a node with this many lower edges draws them as bundles, see Bundle
+BUNDLE_GAP = 40    # pixels between a bundle bus and the top of its row
+LOD_TIERS = (    # level of detail by zoom step:
+    # (lowest zoom, line points (0 - straight), splinesteps, rounded nodes, sockets, text)
+    (-40, 0, 1, False, False, False),
+    (-23, 8, 12, False, False, True),
+    (-12, 32, 6, True, True, True),
+    (-4, 128, 3, True, True, True),
+    (6, 500, 2, True, True, True),
+)
+OBJECT_KEY = 'builtins.object'
+TYPE_KEY = 'builtins.type'
+
+
+# Tcl procedures creating the items of many nodes or lines in one call, the
+# arguments come as Tcl lists so no value is ever quoted by hand
+BATCH_PROCS = """
+namespace eval pyclasstree {}
+proc pyclasstree::nodes {canvas smooth textstate socketstate nodes} {
+    set ids {}
+    foreach {tag label fill outline width points x y top bottom} $nodes {
+        lappend ids [$canvas create polygon $points -smooth $smooth -fill $fill -outline $outline \\
+                         -width $width -tags [list $tag node]]
+        lappend ids [$canvas create text $x $y -text $label -anchor center -state $textstate \\
+                         -tags [list $tag text]]
+        foreach box [list $top $bottom] {
+            lappend ids [$canvas create oval $box -fill orange -activefill green -state $socketstate \\
+                             -tags [list socket $tag]]
+        }
+    }
+    return $ids
+}
+proc pyclasstree::lines {canvas splinesteps lines} {
+    set ids {}
+    foreach {coords fill width} $lines {
+        lappend ids [$canvas create line $coords -smooth 1 -width $width -fill $fill \\
+                         -splinesteps $splinesteps -tags line]
+    }
+    $canvas lower line
+    return $ids
+}
+"""
 
 
 class CustomCanvas(Canvas):
+    def __init__(self, master=None, cnf={}, **kwargs):
+        Canvas.__init__(self, master, cnf, **kwargs)
+        self.tk.eval(BATCH_PROCS)
+
+    def create_nodes_batch(self, nodes, smooth, text_state, socket_state):
+        """Create the items of many nodes with one Tcl call, return their ids, four for every node.
+
+        nodes is the flat list of Node.drawing() values of all the nodes.
+        """
+        ids = self.tk.call('pyclasstree::nodes', self._w, smooth, text_state, socket_state, tuple(nodes))
+        return [self.tk.getint(item) for item in self.tk.splitlist(ids)]
+
+    def create_lines_batch(self, lines, splinesteps):
+        """Create many lines below all other items with one Tcl call, lines is flat (coords, fill, width, ...)."""
+        ids = self.tk.call('pyclasstree::lines', self._w, splinesteps, tuple(lines))
+        return [self.tk.getint(item) for item in self.tk.splitlist(ids)]
+
     def create_circle(self, x, y, radius=2, **kwargs):
         x1, y1, x2, y2 = x - radius, y - radius, x + radius, y + radius
         circle_id = self.create_oval(x1, y1, x2, y2, **kwargs)
@@ -27,102 +120,94 @@ class CustomCanvas(Canvas):
         y = (y2 + y1) / 2
         return x, y
 
+    @staticmethod
+    def round_rectangle_points(x1, y1, x2, y2, radius=25):
+        return [x1 + radius, y1,
+                x1 + radius, y1,
+                x2 - radius, y1,
+                x2 - radius, y1,
+                x2, y1,
+                x2, y1 + radius,
+                x2, y1 + radius,
+                x2, y2 - radius,
+                x2, y2 - radius,
+                x2, y2,
+                x2 - radius, y2,
+                x2 - radius, y2,
+                x1 + radius, y2,
+                x1 + radius, y2,
+                x1, y2,
+                x1, y2 - radius,
+                x1, y2 - radius,
+                x1, y1 + radius,
+                x1, y1 + radius,
+                x1, y1]
+
     def round_rectangle(self, x1, y1, x2, y2, radius=25, **kwargs):
-        points = [x1 + radius, y1,
-                  x1 + radius, y1,
-                  x2 - radius, y1,
-                  x2 - radius, y1,
-                  x2, y1,
-                  x2, y1 + radius,
-                  x2, y1 + radius,
-                  x2, y2 - radius,
-                  x2, y2 - radius,
-                  x2, y2,
-                  x2 - radius, y2,
-                  x2 - radius, y2,
-                  x1 + radius, y2,
-                  x1 + radius, y2,
-                  x1, y2,
-                  x1, y2 - radius,
-                  x1, y2 - radius,
-                  x1, y1 + radius,
-                  x1, y1 + radius,
-                  x1, y1]
+        points = self.round_rectangle_points(x1, y1, x2, y2, radius)
         return self.create_polygon(points, smooth=True, **kwargs)
 
 
-def vertical_graphic_dots(dots, dots_amount=1000):
-    x1, y1, x2, y2 = dots
-    if x1 == x2 or y1 == y2:    # if the graph is a straight line segment - return 2 points
-        return dots
+@lru_cache(maxsize=32)
+def arcsine_profile(dots_amount):
+    """Return (u, v) - the arcsine graph from (0, 0) to (1, 1) sampled for dots_amount points.
 
-    # function parameters
-    if (x1 < x2 and y1 < y2) or (x1 > x2 and y1 > y2):
-        h = abs(y2 - y1) / pi    # length of function value range
-    else:
-        h = -(abs(y2 - y1) / pi)    # h < 0 if the graph of the function is decreasing
+    Every edge is this unit graph stretched over the edge bounding box, so the
+    asin values only depend on the number of points and are computed once.
+    """
+    if numpy is not None:
+        u = numpy.concatenate(([0.0], numpy.arange(2, dots_amount - 1) / dots_amount, [1.0]))
+        v = numpy.arcsin(2 * u - 1) / pi + 0.5
+        return u, v
+    u = array('d', [0.0])
+    u.extend(i / dots_amount for i in range(2, dots_amount - 1))
+    u.append(1.0)
+    v = array('d', (asin(2 * a - 1) / pi + 0.5 for a in u))
+    return u, v
 
-    w = round(2 / abs(x2 - x1), 5)    # function definition length
 
-    x0 = abs(x1 - x2) / 2    # graph center by x
-    y0 = abs(y1 - y2) / 2    # graph center by y
+def arcsine_dots(dots, dots_amount=1000, vertical=True):
+    """Return flat [x, y, x, y, ...] coordinates of the arcsine edge between two points.
 
-    offset_x = min(x1, x2)    # offset of function graph on canvas
-    offset_y = min(y1, y2)
-
-    new_dots_list = []
-    interval = round((abs(x2 - x1) / dots_amount), 5)    # distance between each two points on the graph
-    for i in range(2, dots_amount - 1):
-        x = interval * i
-        try:
-            y = h * asin(w * (x - x0)) + y0
-        except ValueError:
-            continue
-        else:
-            new_dots_list.extend((x + offset_x, y + offset_y))
-
-    if (x1 < x2 and y1 > y2) or (x1 > x2 and y1 < y2):
-        new_dots_list = [min(x1, x2), max(y1, y2)] + new_dots_list + [max(x1, x2), min(y1, y2)]
-    elif (x1 > x2 and y1 > y2) or (x1 < x2 and y1 < y2):
-        new_dots_list = [min(x1, x2), min(y1, y2)] + new_dots_list + [max(x1, x2), max(y1, y2)]
-    return new_dots_list
-
-
-def horizontal_graphic_dots(dots, dots_amount=1000):
+    A vertical edge runs the curve along the x axis (sockets are above each other),
+    a horizontal one along the y axis. Straight segments are returned as they are.
+    """
     x1, y1, x2, y2 = dots
     if x1 == x2 or y1 == y2:    # if the graph is a straight line segment - return 2 points
         return dots
 
-    # function parameters
-    if (x1 < x2 and y1 < y2) or (x1 > x2 and y1 > y2):
-        h = (abs(x2 - x1) / pi)    # length of function value range
+    u, v = arcsine_profile(dots_amount)
+    left, top = min(x1, x2), min(y1, y2)    # offset of function graph on canvas
+    width, height = abs(x2 - x1), abs(y2 - y1)
+    decreasing = (x1 < x2) != (y1 < y2)
+    if vertical:
+        along_start, along_len = left, width
+        across_start, across_len = (top + height, -height) if decreasing else (top, height)
     else:
-        h = -abs(x2 - x1) / pi    # h < 0 if the graph of the function is decreasing
+        along_start, along_len = top, height
+        across_start, across_len = (left + width, -width) if decreasing else (left, width)
 
-    w = round(2 / abs(y2 - y1), 5)    # function definition length
+    if numpy is not None:
+        coords = numpy.empty(2 * len(u))
+        along = u * along_len + along_start
+        across = v * across_len + across_start
+    else:
+        coords = [0.0] * (2 * len(u))
+        along = [a * along_len + along_start for a in u]
+        across = [a * across_len + across_start for a in v]
+    if vertical:
+        coords[0::2], coords[1::2] = along, across
+    else:
+        coords[0::2], coords[1::2] = across, along
+    return coords.tolist() if numpy is not None else coords
 
-    x0 = abs(x1 - x2) / 2    # graph center at x
-    y0 = abs(y1 - y2) / 2    # graph center by y
 
-    offset_x = min(x1, x2)    # offset of function graph on canvas
-    offset_y = min(y1, y2)
+def vertical_graphic_dots(dots, dots_amount=1000):
+    return arcsine_dots(dots, dots_amount, vertical=True)
 
-    new_dots_list = []
-    interval = round((abs(y2 - y1) / dots_amount), 5)    # distance between each two points on the graph
-    for i in range(2, dots_amount - 1):
-        y = interval * i
-        try:
-            x = h * asin(w * (y - y0)) + x0
-        except ValueError:
-            continue
-        else:
-            new_dots_list.extend((x + offset_x, y + offset_y))
 
-    if (x1 < x2 and y1 > y2) or (x1 > x2 and y1 < y2):
-        new_dots_list = [max(x1, x2), min(y1, y2)] + new_dots_list + [min(x1, x2), max(y1, y2)]
-    elif (x1 > x2 and y1 > y2) or (x1 < x2 and y1 < y2):
-        new_dots_list = [min(x1, x2), min(y1, y2)] + new_dots_list + [max(x1, x2), max(y1, y2)]
-    return new_dots_list
+def horizontal_graphic_dots(dots, dots_amount=1000):
+    return arcsine_dots(dots, dots_amount, vertical=False)
 
 
 class CallableNodeSettings(Toplevel):
@@ -143,232 +228,1014 @@ class CallableNodeSettings(Toplevel):
         rgb, hex_color = askcolor()
         if hex_color:
             self.node.lines_color = hex_color
-            for line_tag in self.node.lines.keys():
-                self.node.canvas.itemconfigure(line_tag, fill=hex_color, width=2)
+            for line in self.node.lines:
+                line.configure(fill=hex_color, width=2)
+
+
+class InspectorPanel(CallableNodeSettings):
+    """Members of the class of a node: its MRO, methods, class and static methods,
+    properties, slots and other attributes, each one with the class defining it.
+    One panel serves a window, a click on another node shows that node.
+    """
+    def __init__(self, window, node):
+        CallableNodeSettings.__init__(self, node)
+        self.window = window
+        self.protocol('WM_DELETE_WINDOW', self.close)
+
+        self.row2 = Frame(self)
+        self.row2.pack(side=TOP, expand=YES, fill=BOTH)
+        self.text = Text(self.row2, width=70, height=35, wrap=NONE)
+        self.scrollbar = Scrollbar(self.row2, command=self.text.yview)
+        self.text.config(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.pack(side=RIGHT, fill=Y)
+        self.text.pack(side=LEFT, expand=YES, fill=BOTH)
+        self.text.tag_configure('kind', font=('TkDefaultFont', 10, 'bold'))
+        self.text.tag_configure('origin', foreground='#808080')
+
+    def show(self, node):
+        self.node = node
+        self.title(node.tag)
+        members = self.window.members(node.tag)
+        chunks = []    # text, tags, text, tags... - the whole panel is one insert
+        if node.info.get('diff_detail'):
+            chunks += [f"{node.info['diff']}:\n", 'kind', node.info['diff_detail'] + '\n\n', ()]
+        for kind in ('mro',) + MEMBER_KINDS:
+            if not members[kind]:
+                continue
+            chunks += [f'{kind} ({len(members[kind])}):\n', 'kind']
+            for entry in members[kind]:
+                if kind == 'mro':
+                    chunks += [f'    {entry}\n', ()]
+                else:
+                    name, origin = entry
+                    chunks += [f'    {name}', (), '' if origin == node.tag else f'    {origin}', 'origin', '\n', ()]
+        self.text.config(state=NORMAL)
+        self.text.delete('1.0', END)
+        self.text.insert(END, *chunks)
+        self.text.config(state=DISABLED)
+
+    def close(self):
+        self.window.inspector = None
+        self.destroy()
+
+
+def node_color(tag, node_info):
+    if 'diff' in node_info:    # a node of a diff_trees() graph
+        return DIFF_COLORS[node_info['diff']]
+    if node_info['ismetaclass'] or tag == TYPE_KEY:
+        return '#CD5C5C'
+    elif node_info['module'] == __name__:
+        return 'green'
+    elif tag == OBJECT_KEY:
+        return '#483D8B'
+    return '#BDB76B'
 
 
 class Node:
-    """The node instance stores all its sockets and all associated lines."""
-    node_num = 0
-    selected = False
+    """The node instance stores its canvas items, its lines are found through window.edges.
+
+    x and y are layout coordinates of the top left corner, the canvas position is
+    window.to_canvas(x, y). Canvas items only exist between materialize() and
+    dematerialize(), a virtual window keeps items only for the visible nodes.
+    """
+    __slots__ = ('canvas', 'window', 'info', 'name', 'module', 'row', 'column', 'superclasses',
+                 'subclasses', 'metaclass', 'color', 'lines_color', 'tag', 'id', 'x', 'y',
+                 'offset_x', 'offset_y', 'items')
 
-    all_connections = set()    # all canvas lines: {(tag_1, tag_2), (tag_2, tag_1)}
-    all_nodes = {}    # {node_tag: node_instance}
     def __init__(self, canvas, x, y, tag, node_info, window):
-        Node.node_num += 1
         self.canvas = canvas
         self.window = window
         self.info = node_info
 
-        self.dct = self.info['dct']
+        self.name = self.info['name']
         self.module = self.info['module']
         self.row = self.info['row']
-        self.column = self.info['column']
+        self.column = self.info.get('column')    # set by the built-in layouts only
         self.superclasses = self.info['superclasses']
         self.subclasses = self.info['subclasses']
         self.metaclass = self.info['metaclass']
-        if self.info['ismetaclass'] or tag == 'type':
-            self.color = '#CD5C5C'
-        elif self.module == __name__:
-            self.color = 'green'
-        elif tag == 'object':
-            self.color = '#483D8B'
-        else:
-            self.color = '#BDB76B'
+        self.color = node_color(tag, self.info)
         self.lines_color = 'black'
 
         self.tag = tag
-        self.top_socket_tag = None
-        self.bottom_socket_tag = None
+        self.id = len(self.window.node_list)    # index in window.node_list and node id of window.edges
         self.x = x
         self.y = y
         self.offset_x = 0
         self.offset_y = 0
 
-        self.sockets = {}    # {socket_tag: (x, y)}
-        self.lines = {}    # {line_tag: line_instance}
-
-        self.canvas.round_rectangle(self.x, self.y, self.x + 200, self.y + 50,
-                             fill=self.color, outline='#585858', tags=(self.tag, 'node'))
-        self.canvas.tag_bind(self.tag, "<ButtonPress-1>", self.select_node)
-        self.canvas.tag_bind(self.tag, "<B1-Motion>", self.move_node)
-        self.canvas.tag_bind(self.tag, "<ButtonRelease-1>", self.unselect_node)
-        self.canvas.tag_bind(self.tag, "<Double-1>", self.set_lines_color)
-
-        self.canvas.create_text(self.x + 100, self.y + 25, text=self.tag,
-                                anchor=CENTER, tags=(self.tag, 'text'))
-        self.create_sockets()
-        Node.all_nodes[self.tag] = self
-
-    def create_sockets(self):
-        dots_list = self.count_socket_coord()
-        top_socket = True
-        for x, y in dots_list:
-            if top_socket:
-                socket_tag = f'top:{self.tag}'
-                self.top_socket_tag = socket_tag
-            else:
-                socket_tag = f'bottom:{self.tag}'
-                self.bottom_socket_tag = socket_tag
-            top_socket = not top_socket
-            self.canvas.create_circle(x, y, radius=RADIUS, fill='orange', activefill='green',
-                                      tags=(socket_tag, 'socket', self.tag))
-            self.sockets[socket_tag] = (x, y)
+        self.items = None    # (polygon, text, top socket, bottom socket) canvas ids while drawn
+        self.window.nodes[self.tag] = self
+        self.window.node_list.append(self)
+
+    def drawing(self):
+        """Return (tag, label, fill, outline, outline width, polygon points, text x, text y,
+        top socket box, bottom socket box) - everything needed to create the items."""
+        scale = self.window.zoom_scale
+        x1, y1 = self.window.to_canvas(self.x, self.y)
+        x2, y2 = x1 + NODE_WIDTH * scale, y1 + NODE_HEIGHT * scale
+        radius = RADIUS * scale
+        (top_x, top_y), (bottom_x, bottom_y) = self.count_socket_coord()
+        label = f'{self.name} [+]' if self.tag in self.window.collapsed else self.name
+        outline, outline_width = ('red', 3) if self.tag == self.window.highlighted else ('#585858', 1)
+        return (self.tag, label, self.color, outline, outline_width, self.shape_points(x1, y1, x2, y2),
+                (x1 + x2) / 2, (y1 + y2) / 2,
+                (top_x - radius, top_y - radius, top_x + radius, top_y + radius),
+                (bottom_x - radius, bottom_y - radius, bottom_x + radius, bottom_y + radius))
+
+    def materialize(self):
+        if self.items is not None:
+            return
+        canvas = self.canvas
+        tag, label, fill, outline, outline_width, points, text_x, text_y, top_box, bottom_box = self.drawing()
+        node_tags = (tag, 'node')
+        text_tags = (tag, 'text')
+        socket_tags = ('socket', tag)
+
+        if self.window.node_pool:
+            # reuse the items of a node which went out of view
+            self.items = polygon, text, top, bottom = self.window.node_pool.pop()
+            canvas.coords(polygon, points)
+            canvas.itemconfigure(polygon, fill=fill, smooth=self.window.rounded_nodes,
+                                 outline=outline, width=outline_width, tags=node_tags, state=NORMAL)
+            canvas.coords(text, text_x, text_y)
+            canvas.itemconfigure(text, text=label, tags=text_tags, state=self.window.text_state)
+            canvas.coords(top, top_box)
+            canvas.itemconfigure(top, tags=socket_tags, state=self.window.socket_state)
+            canvas.coords(bottom, bottom_box)
+            canvas.itemconfigure(bottom, tags=socket_tags, state=self.window.socket_state)
+        else:
+            self.items = (
+                canvas.create_polygon(points, smooth=self.window.rounded_nodes, fill=fill,
+                                      outline=outline, width=outline_width, tags=node_tags),
+                canvas.create_text(text_x, text_y, text=label, anchor=CENTER,
+                                   state=self.window.text_state, tags=text_tags),
+                canvas.create_oval(top_box, fill='orange', activefill='green',
+                                   state=self.window.socket_state, tags=socket_tags),
+                canvas.create_oval(bottom_box, fill='orange', activefill='green',
+                                   state=self.window.socket_state, tags=socket_tags))
+
+    def shape_points(self, x1, y1, x2, y2):
+        if self.window.rounded_nodes:
+            return self.canvas.round_rectangle_points(x1, y1, x2, y2, radius=25 * self.window.zoom_scale)
+        return [x1, y1, x2, y1, x2, y2, x1, y2]
+
+    def reshape(self):
+        """Redraw the node rectangle after the level of detail changed."""
+        if self.items is None:
+            return
+        scale = self.window.zoom_scale
+        x1, y1 = self.window.to_canvas(self.x, self.y)
+        points = self.shape_points(x1, y1, x1 + NODE_WIDTH * scale, y1 + NODE_HEIGHT * scale)
+        self.canvas.coords(self.items[0], points)
+        self.canvas.itemconfigure(self.items[0], smooth=self.window.rounded_nodes)
+
+    def dematerialize(self):
+        if self.items is None:
+            return
+        for item in self.items:
+            self.canvas.itemconfigure(item, state=HIDDEN, tags=())
+        self.window.node_pool.append(self.items)
+        self.items = None
+
+    def destroy_items(self):
+        """Delete the canvas items instead of keeping them for reuse."""
+        if self.items is not None:
+            self.canvas.delete(*self.items)
+            self.items = None
+
+    def bbox(self):
+        return self.x, self.y, self.x + NODE_WIDTH, self.y + NODE_HEIGHT
+
+    def move_to(self, x, y):
+        """Put the node to new layout coordinates, its lines follow on the next redraw."""
+        if self.items is not None:
+            scale = self.window.zoom_scale
+            self.canvas.move(self.tag, (x - self.x) * scale, (y - self.y) * scale)
+        self.x = x
+        self.y = y
+        self.row = self.info['row']
+        self.column = self.info.get('column')    # set by the built-in layouts only
+        self.window.redraw.schedule(self)
+
+    @property
+    def dct(self):
+        return self.info['dct']    # may be computed only now, see NodeInfo
+
+    @property
+    def lines(self):
+        window = self.window
+        return [window.lines[edge] for edge in window.edges.edges(self.id)]
+
+    def remove(self):
+        for line in self.lines:
+            line.remove()
+        self.window.hide_item(self)
+        self.window.redraw.nodes.discard(self)
+        del self.window.nodes[self.tag]
+        self.window.node_list[self.id] = None
 
     def count_socket_coord(self):
+        scale = self.window.zoom_scale
+        x, y = self.window.to_canvas(self.x, self.y)
         coord_list = [
-            (self.x + 100,
-             self.y),
-            (self.x + 100,
-             self.y + 50)]
+            (x + NODE_WIDTH / 2 * scale,
+             y),
+            (x + NODE_WIDTH / 2 * scale,
+             y + NODE_HEIGHT * scale)]
         return coord_list
 
-    def update_sockets(self):
-        for tag in self.sockets.keys():
-            new_x, new_y = self.canvas.central_coord(tag)
-            self.sockets[tag] = (new_x, new_y)
-            self.canvas.tkraise(tag)
+    def socket_coord(self, bottom):
+        # socket positions follow self.x and self.y, no need to ask Tk for their bbox
+        return self.count_socket_coord()[bottom]
 
     def select_node(self, event):
-        Node.selected = True
+        self.window.selected = True
+        if self.window.inspector is not None:
+            self.window.inspector.show(self)
         # memorize the cursor coordinates at the moment of the first click on the node
         self.offset_x = event.widget.canvasx(event.x)
         self.offset_y = event.widget.canvasy(event.y)
-        for line_tag in self.lines.keys():
-            self.canvas.itemconfigure(line_tag, fill='#66CDAA', width=1)
+        for line in self.lines:
+            line.configure(fill='#66CDAA', width=1)
 
     def unselect_node(self, event):
-        Node.selected = False
+        self.window.selected = False
         self.offset_x = None
         self.offset_y = None
-        self.update_sockets()
-        self.update_lines()
-        for line_tag in self.lines.keys():
-            self.canvas.itemconfigure(line_tag, fill=self.lines_color, width=2)
+        self.window.redraw.flush()
+        for line in self.lines:
+            line.configure(fill=self.lines_color, width=2)
 
     def move_node(self, event):
         dx = event.widget.canvasx(event.x) - self.offset_x
         dy = event.widget.canvasy(event.y) - self.offset_y
-        self.x += dx
-        self.y += dy
+        self.x += dx / self.window.zoom_scale
+        self.y += dy / self.window.zoom_scale
         self.offset_x += dx  # warning! will work uncorrectly if the offset not added
         self.offset_y += dy
         self.canvas.move(self.tag, dx, dy)
         self.canvas.tkraise(self.tag)
-        self.update_lines()
-        self.update_sockets()
+        self.window.redraw.schedule(self)
 
     def create_all_connections(self):
-        if self.subclasses:
-            for tag in self.subclasses:
-                other_node = Node.all_nodes[tag]
-                self.create_connection_line(other_node, superclass=True)
-        if self.superclasses:
-            for tag in self.superclasses:
-                other_node = Node.all_nodes[tag]
-                self.create_connection_line(other_node, superclass=False)
+        window = self.window
+        for tag in self.subclasses:
+            window.connect(self, window.nodes[tag])
+        for tag in self.superclasses:
+            window.connect(window.nodes[tag], self)
         if self.metaclass:
-            other_node = Node.all_nodes[self.metaclass[0]]
-            self.create_connection_line(other_node, superclass=False)
-
-    def create_connection_line(self, other_node, superclass=True):
-        if superclass:
-            socket_tag_1 = self.bottom_socket_tag
-            socket_tag_2 = other_node.top_socket_tag
-        else:
-            socket_tag_1 = self.top_socket_tag
-            socket_tag_2 = other_node.bottom_socket_tag
-
-        if ((socket_tag_1, socket_tag_2) in Node.all_connections or
-                (socket_tag_2, socket_tag_1) in Node.all_connections):
-            return
-        else:
-            Node.all_connections.add((socket_tag_1, socket_tag_2))
-            Node.all_connections.add((socket_tag_2, socket_tag_1))
-
-        x1, y1 = self.canvas.central_coord(socket_tag_1)
-        x2, y2 = self.canvas.central_coord(socket_tag_2)
-        line = Line(self.canvas, [x1, y1, x2, y2], window=self.window)
-        line.socket_tag_1 = socket_tag_1
-        line.socket_tag_2 = socket_tag_2
-        line.update()
-        self.lines[line.tag] = line
-        other_node.lines[line.tag] = line
+            window.connect(window.nodes[self.metaclass[0]], self)
 
     def update_lines(self):
-        for line in self.lines.values():
+        for line in self.lines:
             line.update()
 
     def set_lines_color(self, event):
-        CallableNodeSettings(self)
-
+        self.window.inspect(self)
+
+    def toggle_collapse(self, event):
+        self.window.collapse(self.tag, self.tag not in self.window.collapsed)
+
+    def toggle_focus(self, event):
+        self.window.focus_view(None if self.window.focus_key == self.tag else self.tag)
+
+
+class EdgeStore:
+    """Edges between integer node ids kept in flat arrays.
+
+    Edge e joins the bottom socket of node upper[e] with the top socket of node
+    lower[e], its end points are coords[4 * e:4 * e + 4]. The edges of a node are
+    looked up CSR-style: down_edges[down_offsets[n]:down_offsets[n + 1]] lead to its
+    lower nodes and up_edges the same way to the upper ones. Edges added after the
+    last compact() wait in the extra lists, removed edges are only marked dead.
+    index finds the live edge between two nodes for add() without a scan.
+    """
+    def __init__(self):
+        self.upper = array('i')
+        self.lower = array('i')
+        self.alive = bytearray()
+        self.coords = array('d')
+        self.down_offsets = array('i', [0])
+        self.down_edges = array('i')
+        self.up_offsets = array('i', [0])
+        self.up_edges = array('i')
+        self.extra = {}    # {node_id: [edge_id, ...]} added since the last compact()
+        self.index = {}    # {(upper, lower): edge_id} of the live edges
+        self.changes = 0    # edges added or removed since the last compact()
+
+    def __len__(self):
+        return len(self.upper)
+
+    def add(self, upper, lower):
+        """Add the edge upper -> lower unless there is one, return its id or None."""
+        if (upper, lower) in self.index:
+            return None
+        edge = self.index[upper, lower] = len(self.upper)
+        self.upper.append(upper)
+        self.lower.append(lower)
+        self.alive.append(1)
+        self.coords.extend((0, 0, 0, 0))
+        self.extra.setdefault(upper, []).append(edge)
+        self.extra.setdefault(lower, []).append(edge)
+        self.changes += 1
+        return edge
+
+    def remove(self, edge):
+        self.alive[edge] = 0
+        self.index.pop((self.upper[edge], self.lower[edge]), None)
+        self.changes += 1
+
+    def find(self, upper, lower):
+        return self.index.get((upper, lower))
 
-class Line:
-    line_num = 0
-    all_lines = {}    # {line_tag: line_instance}
-    def __init__(self, canvas, two_dots, window=None):
-        self.canvas = canvas
+    @staticmethod
+    def span(offsets, edges, node):
+        if node + 1 < len(offsets):
+            return map(edges.__getitem__, range(offsets[node], offsets[node + 1]))    # no copy of the slice
+        return ()
+
+    def down(self, node):
+        """Ids of the live edges from node to its lower nodes."""
+        alive = self.alive
+        found = [edge for edge in self.span(self.down_offsets, self.down_edges, node) if alive[edge]]
+        if node in self.extra:
+            found.extend(edge for edge in self.extra[node] if alive[edge] and self.upper[edge] == node)
+        return found
+
+    def up(self, node):
+        """Ids of the live edges from node to its upper nodes."""
+        alive = self.alive
+        found = [edge for edge in self.span(self.up_offsets, self.up_edges, node) if alive[edge]]
+        if node in self.extra:
+            found.extend(edge for edge in self.extra[node] if alive[edge] and self.lower[edge] == node)
+        return found
+
+    def edges(self, node):
+        return self.down(node) + self.up(node)
+
+    def csr(self, ends, nodes):
+        offsets = array('i', [0]) * (nodes + 1)
+        for edge, node in enumerate(ends):
+            if self.alive[edge]:
+                offsets[node + 1] += 1
+        for node in range(nodes):
+            offsets[node + 1] += offsets[node]
+        edges = array('i', [0]) * offsets[nodes]
+        fill = offsets[:-1]
+        for edge, node in enumerate(ends):
+            if self.alive[edge]:
+                edges[fill[node]] = edge
+                fill[node] += 1
+        return offsets, edges
+
+    def compact(self, nodes):
+        """Rebuild the adjacency arrays of node ids below nodes, empty the extra lists."""
+        self.down_offsets, self.down_edges = self.csr(self.upper, nodes)
+        self.up_offsets, self.up_edges = self.csr(self.lower, nodes)
+        self.extra = {}
+        self.changes = 0
+
+    def get_coords(self, edge):
+        return self.coords[4 * edge:4 * edge + 4].tolist()
+
+    def set_coords(self, edge, dots):
+        self.coords[4 * edge:4 * edge + 4] = array('d', dots)
+
+
+class PooledLine:
+    """A line item of the canvas, taken from window.line_pool when drawn and given back when hidden.
+
+    Subclasses return the points of the item from line_points().
+    """
+    __slots__ = ('canvas', 'window', 'color', 'width', 'item')
+    smooth = True
+
+    def __init__(self, window):
+        self.canvas = window.canvas
         self.window = window
-        Line.line_num += 1
-
-        self.tag = f'line{Line.line_num}'
-        self.socket_tag_1 = None
-        self.socket_tag_2 = None
-        self.dots = None
-        self.create_or_move_line(two_dots)
-        Line.all_lines[self.tag] = self
-
-    def create_or_move_line(self, dots, create=True):
-        self.dots = dots
-        all_dots = vertical_graphic_dots(dots, dots_amount=self.window.line_dots_amount)
-        if create:
-            self.canvas.create_line(all_dots, smooth=True, width=2, fill='black',
-                                    splinesteps=50,
-                                    tags=(self.tag, ))
+        self.color = 'black'
+        self.width = 2
+        self.item = None    # canvas id while drawn
+
+    def line_points(self):
+        raise NotImplementedError
+
+    def materialize(self):
+        if self.item is not None:
+            return
+        points = self.line_points()
+        if self.window.line_pool:
+            self.item = self.window.line_pool.pop()
+            self.canvas.coords(self.item, points)
+            self.canvas.itemconfigure(self.item, fill=self.color, width=self.width, smooth=self.smooth,
+                                      splinesteps=self.window.splinesteps,
+                                      tags='line', state=NORMAL)
         else:
-            self.canvas.coords(self.tag, all_dots)
-        self.canvas.tag_lower(self.tag)
+            self.item = self.canvas.create_line(points, smooth=self.smooth, width=self.width, fill=self.color,
+                                                splinesteps=self.window.splinesteps, tags='line')
+            self.canvas.tag_lower(self.item)
+
+    def dematerialize(self):
+        if self.item is None:
+            return
+        self.canvas.itemconfigure(self.item, state=HIDDEN, tags=())
+        self.window.line_pool.append(self.item)
+        self.item = None
+
+    def destroy_items(self):
+        if self.item is not None:
+            self.canvas.delete(self.item)
+            self.item = None
+
+    def configure(self, fill, width):
+        self.color = fill
+        self.width = width
+        if self.item is not None:
+            self.canvas.itemconfigure(self.item, fill=fill, width=width)
+
+
+class Line(PooledLine):
+    """The canvas line of an edge of window.edges, the edge id is also the index in window.lines."""
+    __slots__ = ('id',)
+
+    def __init__(self, window, edge):
+        PooledLine.__init__(self, window)
+        self.id = edge
+
+    @property
+    def node_1(self):
+        return self.window.node_list[self.window.edges.upper[self.id]]
+
+    @property
+    def node_2(self):
+        return self.window.node_list[self.window.edges.lower[self.id]]
+
+    @property
+    def dots(self):
+        return self.window.edges.get_coords(self.id)
+
+    def drawing(self):
+        """Store the socket coordinates of the edge, return (coords, fill, width) of the line item."""
+        dots = self.socket_dots()
+        self.window.edges.set_coords(self.id, dots)
+        return self.window.line_coords(dots), self.color, self.width
+
+    def line_points(self):
+        return self.drawing()[0]
+
+    def remove(self):
+        bundle = self.window.bundle_of.pop(self.id, None)
+        if bundle is None:
+            self.window.hide_item(self)
+        else:    # a bundled line has no item and is in no grid
+            bundle.edges.remove(self.id)
+            bundle.update()
+        self.window.edges.remove(self.id)
+        self.window.lines[self.id] = None
+
+    def bbox(self):
+        upper, lower = self.node_1, self.node_2
+        x1, x2 = upper.x, lower.x
+        y1, y2 = upper.y + NODE_HEIGHT, lower.y
+        return (min(x1, x2) + NODE_WIDTH / 2, min(y1, y2),
+                max(x1, x2) + NODE_WIDTH / 2, max(y1, y2))
+
+    def configure(self, fill, width):
+        PooledLine.configure(self, fill, width)
+        bundle = self.window.bundle_of.get(self.id)
+        if bundle is not None:
+            bundle.configure(fill, width)
+
+    def socket_dots(self):
+        x1, y1 = self.node_1.socket_coord(True)
+        x2, y2 = self.node_2.socket_coord(False)
+        return [x1, y1, x2, y2]
 
     def update(self, new_dots=None):
-        if new_dots:
-            self.create_or_move_line(new_dots, create=False)
+        dots = new_dots or self.socket_dots()
+        self.window.edges.set_coords(self.id, dots)
+        if self.item is not None:
+            self.canvas.coords(self.item, self.window.line_coords(dots))
+
+
+class Bundle(PooledLine):
+    """Edges from one hub node to the nodes of one row drawn as a single polyline.
+
+    A trunk runs from the bottom socket of the hub down to a horizontal bus above
+    the row, a stub goes from the bus to every lower node. The member edges keep
+    their Line instances, but those are never drawn while bundled.
+    """
+    __slots__ = ('hub', 'edges')
+    smooth = False
+
+    def __init__(self, window, hub, edges):
+        PooledLine.__init__(self, window)
+        self.hub = hub
+        self.edges = edges    # ids of the bundled edges in window.edges
+
+    def lowers(self):
+        node_list, lower = self.window.node_list, self.window.edges.lower
+        return [node_list[lower[edge]] for edge in self.edges]
+
+    def path(self):
+        hidden = self.window.hidden
+        x1, y1 = self.hub.socket_coord(True)
+        sockets = sorted(node.socket_coord(False) for node in self.lowers() if node.tag not in hidden)
+        if not sockets:
+            return [x1, y1, x1, y1]
+        bus = max(y1, min(y for x, y in sockets) - BUNDLE_GAP * self.window.zoom_scale)
+        path = [x1, y1, x1, bus, sockets[0][0], bus]
+        for x, y in sockets:
+            path += [x, bus, x, y, x, bus]
+        return path
+
+    def line_points(self):
+        return self.path()
+
+    def bbox(self):
+        nodes = self.lowers()
+        xs = [node.x for node in nodes] + [self.hub.x]
+        ys = [node.y for node in nodes] + [self.hub.y + NODE_HEIGHT]
+        return min(xs) + NODE_WIDTH / 2, min(ys), max(xs) + NODE_WIDTH / 2, max(ys)
+
+    def update(self):
+        if self.item is not None:
+            self.canvas.coords(self.item, self.path())
+
+
+class RedrawScheduler:
+    """Collects moved nodes and redraws their sockets and lines at most once per frame.
+
+    Motion events come faster than lines can be recomputed, so move_node only
+    marks the node and the actual redraw runs from after/after_idle.
+    on_flush(nodes, lines) is called after every redraw if it is set.
+    """
+    frame_ms = 16
+
+    def __init__(self, widget):
+        self.widget = widget
+        self.nodes = set()    # nodes moved since the last flush
+        self.after_id = None
+        self.last_flush = 0.0
+        self.on_flush = None
+
+    def schedule(self, node):
+        self.nodes.add(node)
+        if self.after_id is not None:
+            return
+        wait = self.frame_ms - (perf_counter() - self.last_flush) * 1000
+        if wait > 0:
+            self.after_id = self.widget.after(ceil(wait), self.on_timer)
+        else:
+            self.after_id = self.widget.after_idle(self.on_timer)
+
+    def on_timer(self):
+        self.after_id = None
+        self.flush()
+
+    def flush(self):
+        if self.after_id is not None:
+            self.widget.after_cancel(self.after_id)
+            self.after_id = None
+        self.last_flush = perf_counter()
+        nodes, self.nodes = self.nodes, set()
+        lines = {}    # a line between two moved nodes is redrawn once
+        bundles = set()    # and so is a bundle of many of their edges
+        bundle_of = self.widget.bundle_of
+        for node in nodes:
+            for line in node.lines:
+                bundle = bundle_of.get(line.id)
+                if bundle is None:
+                    lines[line.id] = line
+                else:
+                    bundles.add(bundle)
+        for line in lines.values():
+            line.update()
+        for bundle in bundles:
+            bundle.update()
+        if self.on_flush is not None and nodes:
+            self.on_flush(nodes, [*lines.values(), *bundles])
+
+
+class SpatialGrid:
+    """Uniform grid over item bounding boxes for "what lies inside this rectangle" queries.
+
+    Items covering more than max_cells cells (long lines) are kept in a separate
+    set and checked one by one instead of being registered in every cell.
+    """
+    def __init__(self, cell=500, max_cells=64):
+        self.cell = cell
+        self.max_cells = max_cells
+        self.cells = {}    # {(column, row): {item, ...}}
+        self.boxes = {}    # {item: bbox}
+        self.large = set()
+
+    def cell_range(self, bbox):
+        x1, y1, x2, y2 = bbox
+        return (int(x1 // self.cell), int(y1 // self.cell),
+                int(x2 // self.cell), int(y2 // self.cell))
+
+    def insert(self, item, bbox):
+        if item in self.boxes:
+            self.remove(item)
+        self.boxes[item] = bbox
+        c1, r1, c2, r2 = self.cell_range(bbox)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > self.max_cells:
+            self.large.add(item)
+            return
+        for column in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                self.cells.setdefault((column, row), set()).add(item)
+
+    def remove(self, item):
+        bbox = self.boxes.pop(item)
+        if item in self.large:
+            self.large.discard(item)
+            return
+        c1, r1, c2, r2 = self.cell_range(bbox)
+        for column in range(c1, c2 + 1):
+            for row in range(r1, r2 + 1):
+                cell = self.cells[column, row]
+                cell.discard(item)
+                if not cell:
+                    del self.cells[column, row]
+
+    def query(self, bbox):
+        x1, y1, x2, y2 = bbox
+        c1, r1, c2, r2 = self.cell_range(bbox)
+        candidates = set(self.large)
+        if (c2 - c1 + 1) * (r2 - r1 + 1) > len(self.cells):
+            for (column, row), cell in self.cells.items():
+                if c1 <= column <= c2 and r1 <= row <= r2:
+                    candidates.update(cell)
+        else:
+            for column in range(c1, c2 + 1):
+                for row in range(r1, r2 + 1):
+                    cell = self.cells.get((column, row))
+                    if cell:
+                        candidates.update(cell)
+        boxes = self.boxes
+        return {item for item in candidates
+                if boxes[item][0] <= x2 and boxes[item][2] >= x1 and boxes[item][1] <= y2 and boxes[item][3] >= y1}
+
+
+class SearchIndex:
+    """Prefix and trigram index over the class names, modules and method names of a tree_dict.
+
+    Texts are lower-cased and stored once. Queries shorter than three characters are
+    answered by binary search for the prefix in the sorted texts, longer ones by
+    checking the texts of the rarest trigram of the query.
+    """
+    def __init__(self, tree_dict):
+        self.keys = list(tree_dict)
+        self.texts = []    # unique lower-case texts
+        self.owners = []    # [[(kind, key id), ...]] for every text
+        ids = {}
+        for key_id, key in enumerate(self.keys):
+            info = tree_dict[key]
+            for kind, words in ((0, [info['name']]), (1, [info['module']]), (2, info['dct'])):
+                for word in words:
+                    text = word.lower()
+                    text_id = ids.get(text)
+                    if text_id is None:
+                        text_id = ids[text] = len(self.texts)
+                        self.texts.append(text)
+                        self.owners.append([])
+                    self.owners[text_id].append((kind, key_id))
+        self.sorted = sorted(range(len(self.texts)), key=self.texts.__getitem__)
+        self.sorted_texts = [self.texts[i] for i in self.sorted]
+        trigrams = {}
+        for text_id, text in enumerate(self.texts):
+            for gram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                trigrams.setdefault(gram, []).append(text_id)
+        self.trigrams = {gram: array('i', text_ids) for gram, text_ids in trigrams.items()}
+
+    def text_ids(self, query):
+        if len(query) < 3:
+            start = bisect_left(self.sorted_texts, query)
+            end = bisect_left(self.sorted_texts, query + '\U0010ffff', start)
+            return self.sorted[start:end]
+        grams = [self.trigrams.get(query[i:i + 3], ()) for i in range(len(query) - 2)]
+        texts = self.texts
+        return [text_id for text_id in min(grams, key=len) if query in texts[text_id]]
+
+    def search(self, query, limit=200):
+        """Return up to limit node keys matching query, best first.
+
+        Exact names come first, then name prefixes, other name matches, modules
+        and method names.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+        best = {}
+        for text_id in self.text_ids(query):
+            text = self.texts[text_id]
+            rank = (text != query, not text.startswith(query), len(text))
+            for kind, key_id in self.owners[text_id]:
+                score = (kind,) + rank
+                if key_id not in best or score < best[key_id]:
+                    best[key_id] = score
+        found = nsmallest(limit, best, key=best.__getitem__)
+        return [self.keys[key_id] for key_id in found]
+
+
+def ancestors(tree_dict, key):
+    """Return key with all its superclasses and metaclasses, direct or not."""
+    found = {key}
+    stack = [key]
+    while stack:
+        info = tree_dict[stack.pop()]
+        for other in info['superclasses'] + info['metaclass']:
+            if other not in found:
+                found.add(other)
+                stack.append(other)
+    return found
+
+
+def descendants(tree_dict, key):
+    """Return key with all its subclasses, direct or not."""
+    found = {key}
+    stack = [key]
+    while stack:
+        for other in tree_dict[stack.pop()]['subclasses']:
+            if other not in found:
+                found.add(other)
+                stack.append(other)
+    return found
+
+
+class Profiler:
+    """Opt-in counters, timers, frame statistics and Chrome trace events of a MainWindow.
+
+    attach() replaces the watched methods of one window and its canvas with
+    measuring wrappers, a window without a profiler runs the plain methods. A frame
+    is one redraw, zoom, cull or refresh; the last one is shown in a HUD on the
+    canvas. dump() writes a trace which chrome://tracing and Perfetto open.
+    """
+    frames = ('redraw.flush', 'canvas_zoomer', 'cull', 'refresh', 'build_step', 'poll_loader')
+    timers = ('count_parameters', 'create_widgets', 'create_nodes', 'create_all_lines', 'apply_lod')
+    canvas_methods = ('coords', 'itemconfigure', 'move', 'scale', 'tkraise', 'tag_lower', 'tag_bind', 'bbox',
+                      'create_line', 'create_polygon', 'create_text', 'create_oval',
+                      'create_nodes_batch', 'create_lines_batch')
+    max_events = 200000
+
+    def __init__(self, hud=True):
+        self.start = perf_counter()
+        self.events = []
+        self.dropped = 0
+        self.counts = {}    # {name: calls}
+        self.totals = {}    # {name: seconds}
+        self.tk_calls = 0
+        self.items = 0    # canvas items created or moved
+        self.frame = None    # name of the frame being measured
+        self.last_frame = None
+        self.window = None
+        self.show_hud = hud
+        self.hud = None
+        self.hud_id = None
+
+    def attach(self, window):
+        self.window = window
+        window.profiler = self
+        for name in self.frames:
+            owner, _, attr = name.rpartition('.')
+            owner = getattr(window, owner) if owner else window
+            setattr(owner, attr, self.measure_frame(name, getattr(owner, attr)))
+        for name in self.timers:
+            setattr(window, name, self.measure(name, getattr(window, name)))
+        window.line_coords = self.measure('curve', window.line_coords, event=False)
+        for name in ('set_xview', 'set_yview'):
+            setattr(window, name, self.follow_view(getattr(window, name)))
+        if hasattr(window, 'canvas'):
+            self.attach_canvas(window.canvas)
+        else:
+            create_widgets = window.create_widgets
+
+            def attach_later():
+                create_widgets()
+                self.attach_canvas(window.canvas)
+            window.create_widgets = attach_later
+
+    def attach_canvas(self, canvas):
+        for name in self.canvas_methods:
+            if hasattr(canvas, name):
+                setattr(canvas, name, self.count_tk(name, getattr(canvas, name)))
+
+    def add_event(self, name, start, end, **args):
+        if len(self.events) >= self.max_events:
+            self.dropped += 1
+            return
+        self.events.append({'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                            'ts': (start - self.start) * 1e6, 'dur': (end - start) * 1e6, 'args': args})
+
+    def record(self, name, seconds):
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def measure(self, name, func, event=True):
+        def measured(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                end = perf_counter()
+                self.record(name, end - start)
+                if event:
+                    self.add_event(name, start, end)
+        return measured
+
+    def measure_frame(self, name, func):
+        def frame(*args, **kwargs):
+            if self.frame is not None:    # e.g. the redraw flush inside a zoom
+                return func(*args, **kwargs)
+            self.frame = name
+            tk_calls, items, curves = self.tk_calls, self.items, self.counts.get('curve', 0)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                end = perf_counter()
+                self.frame = None
+                self.record(name, end - start)
+                stats = {'ms': (end - start) * 1000, 'items': self.items - items,
+                         'tk_calls': self.tk_calls - tk_calls, 'curves': self.counts.get('curve', 0) - curves}
+                self.add_event(name, start, end, **stats)
+                self.last_frame = dict(stats, name=name)
+                self.schedule_hud()
+        return frame
+
+    def count_tk(self, name, func):
+        key = f'tk.{name}'
+        moves = name in ('coords', 'move') or name.startswith('create')
+        batch = name.endswith('_batch')    # one Tk call for many items
+
+        def counted(*args, **kwargs):
+            self.tk_calls += 1
+            if moves and not batch:
+                self.items += 1
+            start = perf_counter()
+            try:
+                result = func(*args, **kwargs)
+                if batch:
+                    self.items += len(result)
+                return result
+            finally:
+                self.record(key, perf_counter() - start)
+        return counted
+
+    def follow_view(self, func):
+        def scrolled(*args):
+            func(*args)
+            self.schedule_hud()
+        return scrolled
+
+    def schedule_hud(self):
+        if self.show_hud and self.hud_id is None and hasattr(self.window, 'canvas'):
+            self.hud_id = self.window.after(50, self.draw_hud)
+
+    def draw_hud(self):
+        """Show the last frame in the top left corner, through Canvas methods which are not counted."""
+        self.hud_id = None
+        canvas = self.window.canvas
+        frame = self.last_frame
+        if frame is None:
+            return
+        text = (f"{frame['name']}: {frame['ms']:.1f} ms, items {frame['items']}, tk calls {frame['tk_calls']}, "
+                f"curves {frame['curves']} | curve maths {self.totals.get('curve', 0) * 1000:.0f} ms total")
+        x, y = canvas.canvasx(8), canvas.canvasy(8)
+        if self.hud is None:
+            self.hud = Canvas.create_text(canvas, x, y, text=text, anchor=NW, fill='white', tags='hud')
+        else:
+            Canvas.coords(canvas, self.hud, x, y)
+            Canvas.itemconfigure(canvas, self.hud, text=text)
+        Canvas.tag_raise(canvas, self.hud)
+
+    def report(self):
+        """Return lines 'name: calls, total ms' sorted by the total time."""
+        return [f'{name}: {self.counts[name]} calls, {seconds * 1000:.1f} ms'
+                for name, seconds in sorted(self.totals.items(), key=lambda item: -item[1])]
+
+    def dump(self, path_or_fp):
+        """Write the trace in Chrome trace-event JSON format."""
+        data = {'traceEvents': self.events, 'displayTimeUnit': 'ms',
+                'otherData': {'counts': self.counts, 'seconds': self.totals, 'dropped_events': self.dropped}}
+        if isinstance(path_or_fp, (str, os.PathLike)):
+            with open(path_or_fp, 'w') as fp:
+                json.dump(data, fp)
         else:
-            if self.socket_tag_1 and self.socket_tag_2:
-                x1, y1 = self.canvas.central_coord(self.socket_tag_1)
-                x2, y2 = self.canvas.central_coord(self.socket_tag_2)
-                self.create_or_move_line([x1, y1, x2, y2], create=False)
+            json.dump(data, path_or_fp)
 
 
 class MainWindow(Frame):
-    def __init__(self, tree, parent=None):
-        Frame.__init__(self, parent)
-        self.pack(expand=YES, fill=BOTH)
+    def __init__(self, tree, parent=None, layout=None, virtual=None, profile=False, progress=None,
+                 bundle=False):
         self.root = parent
 
-        self.tree_dict = tree
+        self.tree = tree
+        self.tree_dict = tree.nodes
+        self.layout = get_layout(layout)
+        self.positions = {}    # {node_tag: (x, y)} computed by the layout
+        # canvas items of this window only, so that several trees can be drawn side by side
+        self.nodes = {}    # {node_tag: node_instance}
+        self.node_list = []    # [node_instance or None], indexed by node id
+        self.edges = EdgeStore()
+        self.lines = []    # [line_instance or None], indexed by edge id
+        self.selected = False
+        self.redraw = RedrawScheduler(self)
+
+        # a virtual window creates canvas items only for nodes and lines near the view
+        if virtual is None:
+            virtual = len(self.tree_dict) > VIRTUAL_NODES
+        self.spatial = SpatialGrid() if virtual else None
+        self.visible = set()    # nodes and lines which have canvas items
+        self.node_pool = []    # items of hidden nodes, ready to be reused
+        self.line_pool = []
+        self.cull_id = None
+        if self.spatial is not None:
+            self.redraw.on_flush = self.reindex
+        # the first drawing of a window without grid goes in steps of BUILD_CHUNK items
+        self.build_queue = [] if self.spatial is None else None
+        self.build_done = 0
+        self.build_id = None
+        self.progress = progress    # progress(drawn, total) after every step of the first drawing
+        # edge bundling: the lower edges of nodes with many of them are drawn row by row as Bundles
+        self.bundle = bundle
+        self.bundles = {}    # {hub node id: [Bundle, ...]}
+        self.bundle_of = {}    # {edge id: Bundle}
+        self.watch_id = None
+        self.watch_interval = 1000
+        self.loader = None    # TreeLoader of load()
+        self.load_id = None
+
+        # navigation: search matches, collapsed subtrees and the focused node
+        self.search_index = None    # SearchIndex built by the first search
+        self.matches = []
+        self.match_num = 0
+        self.highlighted = None
+        self.collapsed = set()    # node keys whose subclasses are not drawn
+        self.focus_key = None    # only its ancestors and descendants are drawn
+        self.hidden = set()    # node keys whose items are deleted, cull skips them
+
+        self.inspector = None    # InspectorPanel opened by a double click on a node
+        self.member_cache = {}    # {node_key: members} in the order of use, see members()
+
         self.rows = 0
         self.columns = 0
         self.line_dots_amount = 500
         self.canvas_w = self.root.winfo_screenwidth()
         self.canvas_h = self.root.winfo_screenheight()
         self.zoom = 0
+        self.zoom_scale = 1    # (11 / 10) ** self.zoom
+        self.origin_x = 0    # canvas position of the layout point (0, 0)
+        self.origin_y = 0
+        self.lod = None    # index in LOD_TIERS
+        self.line_points = self.line_dots_amount
+        self.splinesteps = 50
+        self.rounded_nodes = True
+        self.socket_state = NORMAL
+        self.text_state = NORMAL
         self.xscroll = self.canvas_w
         self.yscroll = self.canvas_h
+        self.region = (-self.canvas_w * 0.5, -self.canvas_h * 0.5, self.canvas_w * 1.5, self.canvas_h * 1.5)
+        self.profiler = None
+        if profile:
+            Profiler().attach(self)
         self.count_parameters()
+        self.create_widgets()
+
+        # graph drawing
+        self.create_nodes()
+        self.create_all_lines()
+        if self.build_queue is not None:
+            self.build_id = self.after_idle(self.build_step)
+
+    node_events = (('<ButtonPress-1>', 'select_node'), ('<B1-Motion>', 'move_node'),
+                   ('<ButtonRelease-1>', 'unselect_node'), ('<Double-1>', 'set_lines_color'),
+                   ('<Button-3>', 'toggle_collapse'), ('<Shift-Button-3>', 'toggle_focus'))
+
+    def create_widgets(self):
+        Frame.__init__(self, self.root)
+        self.pack(expand=YES, fill=BOTH)
+
+        # search box: Return jumps to the next match, Escape clears the search and the focus
+        self.search_entry = Entry(self)
+        self.search_entry.pack(side=TOP, fill=X)
+        self.search_entry.bind('<Return>', self.on_search)
+        self.search_entry.bind('<Escape>', self.on_search_escape)
+        self.query = ''
 
         # create a canvas with scroll bars
         ################################################################################
         self.canvas = CustomCanvas(self, bg='#595959', width=700, height=500)
-        self.canvas.config(scrollregion=(-self.canvas_w * 0.5,
-                                         -self.canvas_h * 0.5,
-                                         self.canvas_w * 1.5,
-                                         self.canvas_h * 1.5))
+        self.canvas.config(scrollregion=self.region)
         self.canvas.config(highlightthickness=0)
 
         self.scroll_x = Scrollbar(self, orient=HORIZONTAL, command=self.canvas.xview)
         self.scroll_y = Scrollbar(self, orient=VERTICAL, command=self.canvas.yview)
 
-        self.canvas.config(yscrollcommand=self.scroll_y.set, xscrollcommand=self.scroll_x.set)
+        self.canvas.config(yscrollcommand=self.set_yview, xscrollcommand=self.set_xview)
 
         self.scroll_x.pack(side=BOTTOM, fill=X)
         self.scroll_y.pack(side=RIGHT, fill=Y)
@@ -376,6 +1243,11 @@ class MainWindow(Frame):
         ################################################################################
         self.canvas.addtag_all(ALL)
 
+        # node event handlers are bound once to the tags shared by all node items
+        for tag in ('node', 'text', 'socket'):
+            for sequence, method in self.node_events:
+                self.canvas.tag_bind(tag, sequence, self.node_handler(method))
+
         # canvas event handlers
         self.canvas.bind("<ButtonPress-1>", self.move_start)
         self.canvas.bind("<B1-Motion>", self.move_canvas)
@@ -385,48 +1257,502 @@ class MainWindow(Frame):
             self.canvas.bind("<Button-4>", self.canvas_zoomer)
             self.canvas.bind("<Button-5>", self.canvas_zoomer)
 
-        # graph drawing
-        self.create_nodes()
-        self.create_all_lines()
-
     def count_parameters(self):
+        self.positions = self.layout(self.tree_dict)
         self.rows = max(dct['row'] for dct in self.tree_dict.values())
         lines_amount = 0
-        row_columns = {num: 1 for num in range(1, self.rows + 1)}
         for dct in self.tree_dict.values():
-            row = dct['row']
-            row_columns[row] += 1
             lines_amount += (len(dct['superclasses']) + len(dct['subclasses']))
-        self.columns = max(col for col in row_columns.values())
+        self.columns = max(Counter(y for x, y in self.positions.values()).values())    # nodes in the widest row
+        width = max(x for x, y in self.positions.values()) + NODE_WIDTH
 
         if (self.rows * 150) + 300 > self.canvas_h:
             self.canvas_h *= ceil((self.rows * 150 + 300) / self.canvas_h)
             self.xscroll = self.canvas_h
-        if (self.columns * 300) + 600 > self.canvas_w:
-            self.canvas_w *= ceil((self.columns * 300 + 600) / self.canvas_w)
+        if width + 600 > self.canvas_w:
+            self.canvas_w *= ceil((width + 600) / self.canvas_w)
             self.yscroll = self.canvas_w
 
         if 10 < lines_amount <= 150:
             self.line_dots_amount = round(log((lines_amount - 10), 0.96) + 130)
-        elif lines_amount > 150:
+        elif lines_amount > 150 and self.spatial is None:
             self.line_dots_amount = 8
+        self.set_lod()
+
+    def set_lod(self):
+        """Switch the level of detail when the zoom crosses a LOD_TIERS threshold.
+
+        Returns True if the tier changed. Items drawn later take the new settings,
+        existing ones are updated by apply_lod().
+        """
+        tier = max(i for i, (zoom, *_) in enumerate(LOD_TIERS) if self.zoom >= zoom)
+        if tier == self.lod:
+            return False
+        self.lod = tier
+        zoom, points, self.splinesteps, self.rounded_nodes, sockets, text = LOD_TIERS[tier]
+        self.line_points = min(points, self.line_dots_amount)
+        self.socket_state = NORMAL if sockets else HIDDEN
+        self.text_state = NORMAL if text else HIDDEN
+        return True
+
+    def apply_lod(self):
+        self.canvas.itemconfigure('socket', state=self.socket_state)
+        self.canvas.itemconfigure('text', state=self.text_state)
+        self.canvas.itemconfigure('line', splinesteps=self.splinesteps)
+        for item in self.visible:
+            if isinstance(item, Node):
+                item.reshape()
+            else:
+                item.update()
 
-    def create_nodes(self):
-        row_columns = {num: 1 for num in range(1, self.rows + 1)}
-        for name, dct in self.tree_dict.items():
-            row = dct['row']
-            column = row_columns[row]
-            dct['column'] = column
-            row_columns[row] += 1
+    def line_coords(self, dots):
+        if not self.line_points:
+            return dots
+        return vertical_graphic_dots(dots, dots_amount=self.line_points)
 
-            x = column * 300 - 250
-            y = row * 150 - 100
-            Node(self.canvas, x, y, tag=name, node_info=dct, window=self)
+    def to_canvas(self, x, y):
+        return x * self.zoom_scale + self.origin_x, y * self.zoom_scale + self.origin_y
 
-    @staticmethod
-    def create_all_lines():
-        for node in Node.all_nodes.values():
+    def from_canvas(self, x, y):
+        return (x - self.origin_x) / self.zoom_scale, (y - self.origin_y) / self.zoom_scale
+
+    def create_nodes(self):
+        for name, (x, y) in self.positions.items():
+            node = Node(self.canvas, x, y, tag=name, node_info=self.tree_dict[name], window=self)
+            self.show_item(node)
+
+    def create_all_lines(self):
+        for node in self.nodes.values():
             node.create_all_connections()
+        self.edges.compact(len(self.node_list))
+        if self.bundle:
+            for node in self.node_list:
+                self.bundle_node(node)
+
+    def bundle_node(self, node):
+        """(Re)build the bundles of the lower edges of node, edges into one row share a bundle.
+
+        Nodes with less than BUNDLE_MIN lower edges and rows with a single edge keep lines.
+        """
+        self.unbundle(node)
+        edges = self.edges.down(node.id)
+        if len(edges) < BUNDLE_MIN:
+            return
+        rows = {}
+        for edge in edges:
+            rows.setdefault(self.node_list[self.edges.lower[edge]].y, []).append(edge)
+        bundles = self.bundles[node.id] = []
+        for y, row_edges in sorted(rows.items()):
+            if len(row_edges) < 2:
+                continue
+            bundle = Bundle(self, node, row_edges)
+            bundles.append(bundle)
+            for edge in row_edges:
+                self.bundle_of[edge] = bundle
+                self.hide_item(self.lines[edge])
+            self.show_item(bundle)
+
+    def unbundle(self, node):
+        for bundle in self.bundles.pop(node.id, ()):
+            self.hide_item(bundle)
+            for edge in bundle.edges:
+                del self.bundle_of[edge]
+                self.show_item(self.lines[edge])
+
+    def connect(self, upper, lower):
+        """Draw the line from the bottom socket of upper to the top socket of lower, once."""
+        edge = self.edges.add(upper.id, lower.id)
+        if edge is None:
+            return None
+        line = Line(self, edge)
+        self.lines.append(line)
+        self.show_item(line)
+        return line
+
+    def node_handler(self, method):
+        """Return an event handler calling the method of the node under the cursor."""
+        def handler(event):
+            for tag in self.canvas.gettags(CURRENT):
+                node = self.nodes.get(tag)
+                if node is not None:
+                    return getattr(node, method)(event)
+        return handler
+
+    def show_item(self, item):
+        """Draw a new node or line now, or register it in the grid of a virtual window."""
+        if self.spatial is None:
+            if self.is_hidden(item):
+                return
+            if self.build_queue is not None:
+                self.build_queue.append(item)    # the first drawing is not finished yet
+                return
+            item.materialize()
+            self.visible.add(item)
+        else:
+            self.spatial.insert(item, item.bbox())
+            self.schedule_cull()
+
+    def build_step(self):
+        """Draw the next BUILD_CHUNK items of the first drawing, the window is shown and
+        stays responsive while a big tree fills in."""
+        queue = self.build_queue
+        chunk = queue[self.build_done:self.build_done + BUILD_CHUNK]
+        self.build_done += len(chunk)
+        # items removed, hidden or drawn in the meantime are skipped
+        chunk = [item for item in chunk if self.is_alive(item) and not self.is_hidden(item)]
+        self.materialize_batch(chunk)
+        self.visible.update(chunk)
+        if self.progress is not None:
+            self.progress(self.build_done, len(queue))
+        if self.build_done < len(queue):
+            self.build_id = self.after(1, self.build_step)
+        else:
+            self.build_queue = None
+            self.build_id = None
+
+    def materialize_batch(self, items):
+        """Create the canvas items of many nodes and lines, the new ones with one Tcl call for each kind."""
+        nodes = [item for item in items if isinstance(item, Node) and item.items is None]
+        lines = [item for item in items if isinstance(item, Line) and item.item is None]
+        for item in items:
+            if isinstance(item, Bundle):    # a few per hub node
+                item.materialize()
+        # pooled items are configured one by one
+        while nodes and self.node_pool:
+            nodes.pop().materialize()
+        while lines and self.line_pool:
+            lines.pop().materialize()
+        if nodes:
+            ids = self.canvas.create_nodes_batch([value for node in nodes for value in node.drawing()],
+                                                 self.rounded_nodes, self.text_state, self.socket_state)
+            for i, node in enumerate(nodes):
+                node.items = tuple(ids[4 * i:4 * i + 4])
+        if lines:
+            ids = self.canvas.create_lines_batch([value for line in lines for value in line.drawing()],
+                                                 self.splinesteps)
+            for line, item in zip(lines, ids):
+                line.item = item
+
+    def hide_item(self, item):
+        item.dematerialize()
+        self.visible.discard(item)
+        if self.spatial is not None:
+            self.spatial.remove(item)
+
+    def is_hidden(self, item):
+        if isinstance(item, Node):
+            return item.tag in self.hidden
+        if isinstance(item, Bundle):
+            return item.hub.tag in self.hidden or all(node.tag in self.hidden for node in item.lowers())
+        return (item.id in self.bundle_of or
+                item.node_1.tag in self.hidden or item.node_2.tag in self.hidden)
+
+    def is_alive(self, item):
+        if isinstance(item, Node):
+            return self.node_list[item.id] is item
+        if isinstance(item, Bundle):
+            return item in self.bundles.get(item.hub.id, ())
+        return self.lines[item.id] is item
+
+
+    ################################################################################
+    # search, collapse and focus
+    ################################################################################
+    def search(self, query):
+        """Find nodes by class name, module or method name, jump to the best match."""
+        if self.search_index is None:
+            self.search_index = SearchIndex(self.tree_dict)
+        self.matches = self.search_index.search(query)
+        self.match_num = 0
+        if self.matches:
+            self.jump_to(self.matches[0])
+        return self.matches
+
+    def next_match(self):
+        if self.matches:
+            self.match_num = (self.match_num + 1) % len(self.matches)
+            self.jump_to(self.matches[self.match_num])
+
+    def on_search(self, event):
+        query = self.search_entry.get()
+        if query == self.query:
+            self.next_match()
+        else:
+            self.query = query
+            self.search(query)
+
+    def on_search_escape(self, event):
+        self.search_entry.delete(0, END)
+        self.query = ''
+        self.matches = []
+        self.highlight(None)
+        self.focus_view(None)
+
+    def highlight(self, key):
+        for tag, outline, width in ((self.highlighted, '#585858', 1), (key, 'red', 3)):
+            node = self.nodes.get(tag)
+            if node is not None and node.items is not None:
+                self.canvas.itemconfigure(node.items[0], outline=outline, width=width)
+        self.highlighted = key
+
+    def jump_to(self, key):
+        """Make the node visible, scroll it to the middle of the view and highlight it."""
+        if key in self.hidden:
+            if self.focus_key is not None and key not in self.focus_keys():
+                self.focus_key = None
+            self.collapsed -= ancestors(self.tree_dict, key) - {key}
+            self.update_hidden()
+        node = self.nodes[key]
+        self.highlight(key)
+        x, y = self.to_canvas(node.x + NODE_WIDTH / 2, node.y + NODE_HEIGHT / 2)
+        x1, y1, x2, y2 = self.region
+        self.canvas.xview_moveto((x - self.canvas.winfo_width() / 2 - x1) / (x2 - x1))
+        self.canvas.yview_moveto((y - self.canvas.winfo_height() / 2 - y1) / (y2 - y1))
+        self.schedule_cull()
+
+    def inspect(self, node):
+        """Show the members of the node class in the inspector panel."""
+        if self.inspector is None:
+            self.inspector = InspectorPanel(self, node)
+        self.inspector.show(node)
+        self.inspector.lift()
+
+    def members(self, key):
+        """Return the class_members() of a node, computed on demand and memoized for MEMBER_CACHE nodes."""
+        members = self.member_cache.pop(key, None)
+        if members is None:
+            cls = self.tree.find_class(key)
+            members = class_members(cls) if cls is not None else record_members(self.tree_dict, key)
+            if len(self.member_cache) >= MEMBER_CACHE:
+                del self.member_cache[next(iter(self.member_cache))]    # the least recently used
+        self.member_cache[key] = members
+        return members
+
+    def collapse(self, key, collapsed=True):
+        """Hide (or show again) all subclasses of the node, their canvas items are deleted."""
+        if collapsed:
+            self.collapsed.add(key)
+        else:
+            self.collapsed.discard(key)
+        self.update_hidden()
+        node = self.nodes[key]
+        if node.items is not None:
+            label = f'{node.name} [+]' if collapsed else node.name
+            self.canvas.itemconfigure(node.items[1], text=label)
+
+    def focus_view(self, key):
+        """Draw only the ancestors and descendants of the node, None draws everything again."""
+        self.focus_key = key
+        self.update_hidden()
+
+    def focus_keys(self):
+        return ancestors(self.tree_dict, self.focus_key) | descendants(self.tree_dict, self.focus_key)
+
+    def update_hidden(self):
+        hidden = set()
+        for key in self.collapsed:
+            hidden |= descendants(self.tree_dict, key) - {key}
+        if self.focus_key is not None:
+            hidden |= self.tree_dict.keys() - self.focus_keys()
+        hide, show = hidden - self.hidden, self.hidden - hidden
+        self.hidden = hidden
+        if hide:
+            # the items of hidden nodes are deleted, not pooled: a collapsed subtree may be large
+            dropped = [item for item in self.visible if self.is_hidden(item)]
+            for item in dropped:
+                item.destroy_items()
+            self.visible.difference_update(dropped)
+        if self.spatial is not None:
+            # hidden items stay in the grid and are skipped by cull
+            self.schedule_cull()
+        else:
+            nodes = self.nodes
+            for key in show:
+                self.show_item(nodes[key])
+            for line in {line for key in show for line in nodes[key].lines}:
+                self.show_item(line)
+        for bundles in self.bundles.values():
+            for bundle in bundles:
+                bundle.update()    # a stub for every node which is not hidden
+                if self.spatial is None and bundle not in self.visible:
+                    self.show_item(bundle)
+
+    def reindex(self, nodes, lines):
+        for item in (*nodes, *lines):
+            self.spatial.insert(item, item.bbox())
+        self.schedule_cull()
+
+    def set_xview(self, first, last):
+        self.scroll_x.set(first, last)
+        self.schedule_cull()
+
+    def set_yview(self, first, last):
+        self.scroll_y.set(first, last)
+        self.schedule_cull()
+
+    def schedule_cull(self):
+        if self.spatial is not None and self.cull_id is None:
+            self.cull_id = self.after_idle(self.cull)
+
+    def cull(self):
+        """Create items for nodes and lines near the view and recycle the items of the others."""
+        self.cull_id = None
+        x1, y1 = self.from_canvas(self.canvas.canvasx(-CULL_MARGIN), self.canvas.canvasy(-CULL_MARGIN))
+        x2, y2 = self.from_canvas(self.canvas.canvasx(self.canvas.winfo_width() + CULL_MARGIN),
+                                  self.canvas.canvasy(self.canvas.winfo_height() + CULL_MARGIN))
+        visible = self.spatial.query((x1, y1, x2, y2))
+        if self.hidden:
+            visible = {item for item in visible if not self.is_hidden(item)}
+        for item in self.visible - visible:
+            item.dematerialize()
+        self.materialize_batch(visible - self.visible)
+        self.visible = visible
+        if self.progress is not None:
+            # the first drawing of a virtual window is one step: the items near the view
+            self.progress(len(visible), len(visible))
+            self.progress = None
+
+    def watch(self, interval=1000):
+        """Refresh the tree every interval ms, until unwatch()."""
+        self.watch_interval = interval
+        if self.watch_id is None:
+            self.watch_id = self.after(interval, self.on_watch)
+
+    def unwatch(self):
+        if self.watch_id is not None:
+            self.after_cancel(self.watch_id)
+            self.watch_id = None
+
+    def on_watch(self):
+        self.watch_id = self.after(self.watch_interval, self.on_watch)
+        if not self.selected and self.load_id is None:    # not under the cursor or the loader
+            self.refresh()
+
+    def refresh(self):
+        """Patch the canvas after classes were defined or collected, return (added, removed, changed).
+
+        Only the nodes and lines of the changed classes are created or removed and
+        only the nodes which the layout moved are redrawn.
+        """
+        added, removed, changed = self.tree.refresh()
+        if added or removed or changed:
+            self.apply_changes(added, removed, changed)
+        return added, removed, changed
+
+    def apply_changes(self, added, removed, changed):
+        """Draw the nodes added to the tree, remove the removed ones and connect the changed ones."""
+        self.redraw.flush()
+        hubs = set()    # nodes whose bundles change
+        for key in removed | added:
+            if key in self.nodes:
+                if self.bundle:
+                    hubs.update(line.node_1 for line in self.nodes[key].lines)
+                    self.unbundle(self.nodes[key])
+                self.nodes[key].remove()
+                self.positions.pop(key, None)
+        if isinstance(self.layout, LayeredLayout) and len(added) * 2 < len(self.tree_dict):
+            moved = self.layout.update(self.tree_dict, added | removed | changed)
+        else:    # a full layout is quicker when most of the tree is new, e.g. while loading
+            positions = self.layout(self.tree_dict)
+            moved = {key: pos for key, pos in positions.items() if self.positions.get(key) != pos}
+        self.positions.update(moved)
+        for key in added:
+            x, y = self.positions[key]
+            self.show_item(Node(self.canvas, x, y, tag=key, node_info=self.tree_dict[key], window=self))
+        for key, (x, y) in moved.items():
+            if key not in added:
+                if self.bundle and y != self.nodes[key].y:    # bundles are made by rows
+                    hubs.update(line.node_1 for line in self.nodes[key].lines)
+                self.nodes[key].move_to(x, y)
+        for key in added | changed:
+            if key in self.nodes:
+                self.nodes[key].create_all_connections()
+        if self.edges.changes * 4 > len(self.edges):
+            self.edges.compact(len(self.node_list))
+        if self.bundle:
+            hubs.update(line.node_1 for key in added for line in self.nodes[key].lines)
+            for node in hubs:
+                if self.is_alive(node):
+                    self.bundle_node(node)
+        # new classes may land in a collapsed or unfocused subtree
+        self.search_index = None
+        self.member_cache.clear()
+        self.matches = [key for key in self.matches if key not in removed]
+        self.hidden -= removed
+        self.collapsed -= removed
+        if self.focus_key in removed:
+            self.focus_key = None
+        self.update_hidden()
+        self.redraw.flush()
+        if added:
+            self.fit_region()
+
+    def fit_region(self):
+        """Grow the scrollregion over nodes added beyond it."""
+        x, y = self.to_canvas(max(x for x, y in self.positions.values()) + NODE_WIDTH + 600,
+                              max(y for x, y in self.positions.values()) + NODE_HEIGHT + 300)
+        if x <= self.xscroll * 1.5 and y <= self.yscroll * 1.5:
+            return
+        self.xscroll = max(self.xscroll, x / 1.5)
+        self.yscroll = max(self.yscroll, y / 1.5)
+        self.region = (-self.xscroll * 0.5, -self.yscroll * 0.5, self.xscroll * 1.5, self.yscroll * 1.5)
+        self.canvas.config(scrollregion=self.region)
+
+    def load(self, loader):
+        """Start the TreeLoader and add its records to the tree as they arrive.
+
+        The canvas stays usable meanwhile, a bar at the bottom shows the number of
+        classes and cancels the loading.
+        """
+        self.loader = loader
+        self.status = Frame(self)
+        self.status_label = Label(self.status, text='loading...', anchor=W)
+        self.status_label.pack(side=LEFT, fill=X, expand=YES)
+        self.cancel_button = Button(self.status, text='cancel', command=self.cancel_load)
+        self.cancel_button.pack(side=RIGHT)
+        self.status.pack(side=BOTTOM, fill=X, before=self.scroll_x)
+        loader.start()
+        self.load_id = self.after(LOAD_POLL_MS, self.poll_loader)
+
+    def poll_loader(self):
+        start = perf_counter()
+        records = []
+        done, error = False, None
+        while True:
+            try:
+                message = self.loader.queue.get_nowait()
+            except Empty:
+                break
+            if isinstance(message, list):
+                records += message
+            else:    # None at the end, or the exception which stopped the loader
+                done, error = True, message
+                break
+        if records:
+            added, changed = self.tree.add_nodes(records)
+            self.apply_changes(added, set(), changed)
+        if not done:
+            if records:
+                self.status_label.config(text=f'loading: {len(self.tree_dict)} classes')
+            # the layout update grows with the tree, wait longer to add bigger batches
+            wait = max(LOAD_POLL_MS, round((perf_counter() - start) * 3000))
+            self.load_id = self.after(wait, self.poll_loader)
+            return
+        self.load_id = None
+        self.loader.adopt(self.tree)
+        if error is None:
+            self.status.destroy()
+        else:
+            self.status_label.config(text=f'loading stopped: {error!r}')
+            self.cancel_button.destroy()
+
+    def cancel_load(self):
+        """Stop the TreeLoader, the classes added so far stay on the canvas."""
+        self.loader.cancelled.set()
+        if self.load_id is not None:
+            self.after_cancel(self.load_id)
+            self.load_id = None
+        self.status.destroy()
 
     def canvas_zoomer(self, event):
         x = self.canvas.canvasx(event.x)
@@ -434,35 +1760,450 @@ class MainWindow(Frame):
         if event.num == 4 or event.delta > 0:
             if self.zoom + 1 >= 20:
                 return
+            factor = 11 / 10
             self.zoom += 1
-            self.xscroll *= (11 / 10)
-            self.yscroll *= (11 / 10)
-            self.canvas.scale("all", x, y, (11 / 10), (11 / 10))
         elif event.num == 5 or event.delta < 0:
             if self.zoom - 1 <= -40:
                 return
+            factor = 10 / 11
             self.zoom -= 1
-            self.xscroll *= (10 / 11)
-            self.yscroll *= (10 / 11)
-            self.canvas.scale("all", x, y, (10 / 11), (10 / 11))
-        self.canvas.config(scrollregion=(-self.xscroll * 0.5,
-                                         -self.yscroll * 0.5,
-                                         self.xscroll * 1.5,
-                                         self.yscroll * 1.5))
-        if self.zoom < -23:
-            self.canvas.itemconfig('text', state=HIDDEN)
         else:
-            self.canvas.itemconfig('text', state=NORMAL)
+            return
+        self.redraw.flush()
+        # zoom is a change of the layout -> canvas transform, nodes keep their layout coordinates
+        self.zoom_scale *= factor
+        self.origin_x = x + (self.origin_x - x) * factor
+        self.origin_y = y + (self.origin_y - y) * factor
+        self.xscroll *= factor
+        self.yscroll *= factor
+        self.canvas.scale("all", x, y, factor, factor)    # a virtual window has only visible items
+        self.region = (-self.xscroll * 0.5, -self.yscroll * 0.5, self.xscroll * 1.5, self.yscroll * 1.5)
+        self.canvas.config(scrollregion=self.region)
+        if self.set_lod():
+            self.apply_lod()
+        self.schedule_cull()
 
     def move_start(self, event):
         self.canvas.scan_mark(event.x, event.y)
 
     def move_canvas(self, event):
-        if Node.selected:
+        if self.selected:
             return
         self.canvas.scan_dragto(event.x, event.y, gain=1)
 
 
+def layout_nodes(tree_dict):
+    """Give every node the next free column of its row, return {node_key: (x, y)}."""
+    row_columns = {}
+    positions = {}
+    for name, dct in tree_dict.items():
+        row = dct['row']
+        column = row_columns.get(row, 1)
+        dct['column'] = column
+        row_columns[row] = column + 1
+        positions[name] = (column * 300 - 250, row * 150 - 100)
+    return positions
+
+
+class LayeredLayout:
+    """Sugiyama-style layout: rows come from node_info['row'], the order inside each row
+    is found by barycenter (or median) crossing reduction and x coordinates are pulled
+    towards the connected nodes of the neighbour rows.
+
+    Edges spanning several rows get dummy vertices in the rows between, so that long
+    edges take part in the ordering and keep their way free of nodes. The layout object
+    keeps its orders and coordinates, update() reorders only the rows touched by a change.
+    """
+    def __init__(self, sweeps=4, method='barycenter', dummies=True, gap=50, row_height=150):
+        if method not in ('barycenter', 'median'):
+            raise ValueError(f'unknown crossing reduction method: {method!r}')
+        self.sweeps = sweeps
+        self.method = method
+        self.dummies = dummies
+        self.gap = gap
+        self.row_height = row_height
+
+        self.layers = {}    # {row: [vertex, ...]} - vertex is a node key or a dummy tuple
+        self.row_of = {}    # {vertex: row}
+        self.index = {}    # {vertex: index in its layer}
+        self.x = {}    # {vertex: x of the vertex center}
+        self.up = {}    # {vertex: [connected vertices of the row above]}
+        self.down = {}    # {vertex: [connected vertices of the row below]}
+
+    def __call__(self, tree_dict):
+        return self.layout(tree_dict)
+
+    def layout(self, tree_dict):
+        """Lay out the whole tree, return {node_key: (x, y)} of the node top left corners."""
+        self.layers, self.index, self.x = {}, {}, {}
+        self.build(tree_dict)
+        rows = sorted(self.layers)
+        self.reduce_crossings(rows)
+        self.place(rows)
+        shift = 50 - min(self.x[layer[0]] - self.width(layer[0]) / 2 for layer in self.layers.values())
+        for vertex in self.x:
+            self.x[vertex] += shift
+        return self.positions(tree_dict)
+
+    def update(self, tree_dict, changed):
+        """Lay out again after the nodes of changed were added, removed or re-parented.
+
+        Only the vertices and edges of the changed nodes are rebuilt, only their rows
+        and the neighbour rows are reordered and placed, the others keep their order
+        and coordinates. Returns the positions of the nodes whose position changed.
+        """
+        old_x = dict(self.x)
+        old_row = {key: self.row_of.get(key) for key in changed}
+        touched = set()
+        dirty = set()    # rows which got or lost vertices
+        pairs = set()    # (node key, node key) to connect again
+        for key in changed:
+            if key in self.row_of:
+                touched.add(self.row_of[key])
+                pairs.update((key, other) for other in self.detach(key, dirty))
+        for key in changed:
+            info = tree_dict.get(key)
+            row = self.row_of.get(key)
+            if info is None or info['row'] != row:
+                if row is not None:
+                    self.remove_vertex(key, dirty)
+                if info is not None:
+                    self.add_vertex(self.layers, key, info['row'])
+                    dirty.add(info['row'])
+            if info is not None:
+                touched.add(info['row'])
+                pairs.update((key, other) for other in info['superclasses'] + info['metaclass'] + info['subclasses'])
+        connected = set()
+        for key_1, key_2 in pairs:
+            if key_1 not in tree_dict or key_2 not in tree_dict or frozenset((key_1, key_2)) in connected:
+                continue
+            info_1, info_2 = tree_dict[key_1], tree_dict[key_2]
+            if key_2 in info_1['superclasses'] + info_1['metaclass'] or key_1 in info_2['superclasses'] + info_2['metaclass']:
+                connected.add(frozenset((key_1, key_2)))
+                self.connect(self.layers, key_1, key_2)
+                rows = sorted((self.row_of[key_1], self.row_of[key_2]))
+                dirty.update(range(rows[0] + 1, rows[1]))    # dummy vertices
+        for row in dirty:
+            for i, vertex in enumerate(self.layers.get(row, ())):
+                self.index[vertex] = i
+
+        rows = {row + step for row in touched for step in (-1, 0, 1)} & self.layers.keys()
+        # rows crossed by the dummy vertices of new long edges
+        rows.update(row for row in dirty & self.layers.keys()
+                    if any(vertex not in self.x for vertex in self.layers[row]))
+        rows = sorted(rows)
+        self.reduce_crossings(rows)
+        self.place(rows)
+        moved = {}
+        for key, pos in self.positions(tree_dict, rows).items():
+            row = old_row.get(key, self.row_of[key])
+            if key not in old_x or pos != (old_x[key] - NODE_WIDTH / 2, row * self.row_height - 100):
+                moved[key] = pos
+        return moved
+
+    def detach(self, key, dirty):
+        """Remove the edges of a vertex with their dummies, return the nodes at the other ends."""
+        ends = []
+        for adjacency, back in ((self.up, self.down), (self.down, self.up)):
+            for vertex in adjacency[key]:
+                previous = key
+                while isinstance(vertex, tuple):
+                    previous, vertex = vertex, adjacency[vertex][0]
+                    self.remove_vertex(previous, dirty)
+                back[vertex].remove(previous)
+                ends.append(vertex)
+            adjacency[key] = []
+        return ends
+
+    def remove_vertex(self, vertex, dirty):
+        row = self.row_of.pop(vertex)
+        layer = self.layers[row]
+        layer.remove(vertex)
+        if not layer:
+            del self.layers[row]
+        del self.up[vertex], self.down[vertex]
+        self.index.pop(vertex, None)
+        self.x.pop(vertex, None)
+        dirty.add(row)
+
+    def build(self, tree_dict):
+        """Fill layers and up/down adjacency, keeping the previous order of known vertices."""
+        previous = self.index
+        self.row_of, self.up, self.down = {}, {}, {}
+        layers = {}
+        for key, info in tree_dict.items():
+            self.add_vertex(layers, key, info['row'])
+        for key, info in tree_dict.items():
+            for other in info['superclasses'] + info['metaclass']:
+                if other in tree_dict:
+                    self.connect(layers, key, other)
+        for layer in layers.values():
+            # already placed vertices first in their old order, new ones after them
+            layer.sort(key=lambda vertex: previous.get(vertex, len(previous)))
+        self.layers = layers
+        self.index = {vertex: i for layer in layers.values() for i, vertex in enumerate(layer)}
+        for vertex in [vertex for vertex in self.x if vertex not in self.row_of]:
+            del self.x[vertex]
+
+    def add_vertex(self, layers, vertex, row):
+        self.row_of[vertex] = row
+        self.up[vertex] = []
+        self.down[vertex] = []
+        layers.setdefault(row, []).append(vertex)
+
+    def connect(self, layers, key_1, key_2):
+        row_1, row_2 = self.row_of[key_1], self.row_of[key_2]
+        if row_1 == row_2:
+            return
+        if row_1 > row_2:
+            key_1, key_2, row_1, row_2 = key_2, key_1, row_2, row_1
+        chain = [key_1]
+        if self.dummies:
+            for row in range(row_1 + 1, row_2):
+                dummy = ('dummy', key_1, key_2, row)
+                self.add_vertex(layers, dummy, row)
+                chain.append(dummy)
+        chain.append(key_2)
+        for upper, lower in zip(chain, chain[1:]):
+            self.down[upper].append(lower)
+            self.up[lower].append(upper)
+
+    def width(self, vertex):
+        return 0 if isinstance(vertex, tuple) else NODE_WIDTH
+
+    def weight(self, vertex, neighbours, size):
+        positions = [self.index[other] / size for other in neighbours]
+        if not positions:
+            return self.index[vertex] / len(self.layers[self.row_of[vertex]])
+        if self.method == 'median':
+            positions.sort()
+            return positions[len(positions) // 2]
+        return sum(positions) / len(positions)
+
+    def sort_layer(self, row, adjacency, other_row):
+        layer = self.layers[row]
+        size = max(len(self.layers.get(other_row, ())), 1)
+        weights = {vertex: self.weight(vertex, adjacency[vertex], size) for vertex in layer}
+        layer.sort(key=weights.__getitem__)
+        for i, vertex in enumerate(layer):
+            self.index[vertex] = i
+
+    def reduce_crossings(self, rows):
+        """Run down and up barycenter sweeps over rows, keep the orders with fewest crossings."""
+        best = self.crossings(rows)
+        best_layers = {row: list(self.layers[row]) for row in rows}
+        for _ in range(self.sweeps):
+            for row in rows:
+                self.sort_layer(row, self.up, row - 1)
+            for row in reversed(rows):
+                self.sort_layer(row, self.down, row + 1)
+            crossings = self.crossings(rows)
+            if crossings < best:
+                best = crossings
+                best_layers = {row: list(self.layers[row]) for row in rows}
+            if not crossings:
+                break
+        for row, layer in best_layers.items():
+            self.layers[row] = layer
+            for i, vertex in enumerate(layer):
+                self.index[vertex] = i
+        return best
+
+    def crossings(self, rows=None):
+        """Count edge crossings between neighbour rows (inversions of the lower ends).
+
+        With rows given, only the crossings which the order of these rows affects.
+        """
+        if rows is None:
+            rows = self.layers
+        else:
+            rows = {row + step for row in rows for step in (-1, 0)} & self.layers.keys()
+        total = 0
+        for row in rows:
+            layer = self.layers[row]
+            ends = []
+            for vertex in layer:
+                ends.extend(sorted(self.index[other] for other in self.down[vertex]
+                                   if self.row_of[other] == row + 1))
+            # a Fenwick tree counts the ends on the right which are smaller
+            size = len(self.layers.get(row + 1, ()))
+            counts = [0] * (size + 1)
+            for end in reversed(ends):
+                i = end
+                while i > 0:
+                    total += counts[i]
+                    i -= i & -i
+                i = end + 1
+                while i <= size:
+                    counts[i] += 1
+                    i += i & -i
+        return total
+
+    def place(self, rows):
+        """Give x coordinates to the vertices of rows, two passes pull them to their neighbours."""
+        for row in rows:
+            layer = self.layers[row]
+            if any(vertex not in self.x for vertex in layer):
+                self.balance(layer, {vertex: self.x.get(vertex, 0) for vertex in layer})
+        for _ in range(2):
+            for row in rows:
+                self.balance_to(row, self.up)
+            for row in reversed(rows):
+                self.balance_to(row, self.down)
+
+    def balance_to(self, row, adjacency):
+        layer = self.layers[row]
+        desired = {}
+        for vertex in layer:
+            neighbours = adjacency[vertex]
+            if neighbours:
+                desired[vertex] = sum(self.x[other] for other in neighbours) / len(neighbours)
+            else:
+                desired[vertex] = self.x[vertex]
+        self.balance(layer, desired)
+
+    def balance(self, layer, desired):
+        """Move the vertices of a layer as close to desired as the ordering and gaps allow."""
+        separations = [(self.width(a) + self.width(b)) / 2 + self.gap for a, b in zip(layer, layer[1:])]
+        left = [desired[layer[0]]]
+        for vertex, separation in zip(layer[1:], separations):
+            left.append(max(desired[vertex], left[-1] + separation))
+        right = [desired[layer[-1]]]
+        for vertex, separation in zip(reversed(layer[:-1]), reversed(separations)):
+            right.append(min(desired[vertex], right[-1] - separation))
+        right.reverse()
+        for vertex, x_left, x_right in zip(layer, left, right):
+            self.x[vertex] = (x_left + x_right) / 2
+
+    def positions(self, tree_dict, rows=None):
+        positions = {}
+        for row in (self.layers if rows is None else rows):
+            layer = self.layers[row]
+            column = 1
+            for vertex in layer:
+                if vertex in tree_dict:
+                    tree_dict[vertex]['column'] = column
+                    column += 1
+                    positions[vertex] = (self.x[vertex] - NODE_WIDTH / 2, row * self.row_height - 100)
+        return positions
+
+    def bends(self, key_1, key_2):
+        """Return the (x, y) centers of the dummy vertices of the edge between two nodes."""
+        if self.row_of[key_1] > self.row_of[key_2]:
+            key_1, key_2 = key_2, key_1
+        return [(self.x[vertex], row * self.row_height - 100 + NODE_HEIGHT / 2)
+                for row in range(self.row_of[key_1] + 1, self.row_of[key_2])
+                for vertex in [('dummy', key_1, key_2, row)] if vertex in self.x]
+
+
+LAYOUTS = {'columns': layout_nodes, 'layered': LayeredLayout}
+
+
+def get_layout(layout):
+    """Return a callable tree_dict -> {node_key: (x, y)} for a LAYOUTS name or a callable."""
+    if layout is None:
+        layout = 'layered'
+    if isinstance(layout, str):
+        layout = LAYOUTS[layout]
+        return layout() if isinstance(layout, type) else layout
+    return layout
+
+
+################################################################################
+# HEADLESS EXPORT (SVG, GRAPHVIZ DOT, JSON):
+################################################################################
+def edge_dots(positions, sub, sup):
+    """Return [x1, y1, x2, y2] from the bottom socket of sup to the top socket of sub."""
+    sup_x, sup_y = positions[sup]
+    sub_x, sub_y = positions[sub]
+    return [sup_x + NODE_WIDTH / 2, sup_y + NODE_HEIGHT, sub_x + NODE_WIDTH / 2, sub_y]
+
+
+def write_svg(tree, fp, dots_amount=50, layout=None):
+    if isinstance(tree, ClassStream):
+        tree = tree.to_tree()    # the layout needs all nodes at once
+    positions = get_layout(layout)(tree.nodes)
+    width = max(x for x, y in positions.values()) + NODE_WIDTH + 50
+    height = max(y for x, y in positions.values()) + NODE_HEIGHT + 50
+    fp.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+             f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+             f'viewBox="0 0 {width} {height}" font-family="sans-serif" font-size="12">\n'
+             f'<rect width="{width}" height="{height}" fill="#595959"/>\n')
+    fp.write('<g fill="none" stroke="black" stroke-width="2">\n')
+    for sub, sup, kind in tree.edges:
+        dots = arcsine_dots(edge_dots(positions, sub, sup), dots_amount)
+        points = ' '.join(f'{dots[i]:.1f},{dots[i + 1]:.1f}' for i in range(0, len(dots), 2))
+        dash = ' stroke-dasharray="6,4"' if kind == 'metaclass' else ''
+        fp.write(f'<polyline points="{points}"{dash}/>\n')
+    fp.write('</g>\n')
+    for key, (x, y) in positions.items():
+        info = tree.nodes[key]
+        center = x + NODE_WIDTH / 2
+        title = f"{key} ({info['diff']})\n{info['diff_detail']}" if 'diff' in info else key
+        fp.write(f'<g><title>{escape(title)}</title>'
+                 f'<rect x="{x}" y="{y}" width="{NODE_WIDTH}" height="{NODE_HEIGHT}" rx="12" '
+                 f'fill="{node_color(key, info)}" stroke="#585858"/>'
+                 f'<text x="{center}" y="{y + NODE_HEIGHT / 2}" text-anchor="middle" '
+                 f'dominant-baseline="middle">{escape(info["name"])}</text>'
+                 f'<circle cx="{center}" cy="{y}" r="{RADIUS}" fill="orange"/>'
+                 f'<circle cx="{center}" cy="{y + NODE_HEIGHT}" r="{RADIUS}" fill="orange"/></g>\n')
+    fp.write('</svg>\n')
+
+
+def dot_id(key):
+    return '"' + key.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def write_dot(tree, fp, **options):
+    fp.write(f'digraph {dot_id(tree.root_key)} {{\n'
+             '    rankdir=BT;\n'
+             '    node [shape=box, style="rounded,filled"];\n')
+    for key, info in tree.iter_nodes():
+        fp.write(f'    {dot_id(key)} [label={dot_id(info["name"])}, fillcolor={dot_id(node_color(key, info))}];\n')
+    for sub, sup, kind in tree.iter_edges():
+        style = ' [style=dashed]' if kind == 'metaclass' else ''
+        fp.write(f'    {dot_id(sub)} -> {dot_id(sup)}{style};\n')
+    fp.write('}\n')
+
+
+def write_json(tree, fp, **options):
+    """Write {"root": key, "nodes": {node_key: node_info}, "edges": [[sub, sup, kind]]}."""
+    fp.write(f'{{"root": {json.dumps(tree.root_key)},\n"nodes": {{')
+    separator = '\n'
+    for key, info in tree.iter_nodes():
+        record = {field: info[field] for field in NODE_FIELDS}
+        record.update(info)    # extra fields, e.g. the layout column
+        fp.write(f'{separator}{json.dumps(key)}: {json.dumps(record)}')
+        separator = ',\n'
+    fp.write('},\n"edges": [')
+    separator = '\n'
+    for edge in tree.iter_edges():
+        fp.write(f'{separator}{json.dumps(edge)}')
+        separator = ',\n'
+    fp.write(']}\n')
+
+
+EXPORTERS = {'svg': write_svg, 'dot': write_dot, 'gv': write_dot, 'json': write_json}
+
+
+def export_tree(tree, path_or_fp, fmt=None, **options):
+    """Write tree to a file name or an open text stream, fmt defaults to the file extension.
+
+    options go to the writer, e.g. layout and dots_amount of write_svg.
+    """
+    if fmt is None:
+        fmt = path_or_fp.rsplit('.', 1)[-1] if isinstance(path_or_fp, str) else 'svg'
+    try:
+        writer = EXPORTERS[fmt.lower()]
+    except KeyError:
+        raise ValueError(f'unknown export format: {fmt!r}') from None
+    if isinstance(path_or_fp, str):
+        with open(path_or_fp, 'w', encoding='utf-8') as fp:
+            writer(tree, fp, **options)
+    else:
+        writer(tree, path_or_fp, **options)
+
+
 ################################################################################
 # LOGIC OF PROCESSING AND BUILDING A CLASS TREE:
 ################################################################################
@@ -482,70 +2223,689 @@ def all_paths(cls_obj):
     return paths
 
 
-tree_dict = {}
-def inspect_class_tree(cls_list):
-    add_type_dtc = False
+def class_depths(cls_list, depths=None, bases=None, root=object):
+    """Return {cls: row}, where row is the length of the longest path from cls to object.
+
+    Equivalent to max(len(path) for path in all_paths(cls)), but every class is
+    visited once. Pass the same depths dict again to reuse already computed rows.
+    bases and root allow the same walk over other graphs, e.g. node keys. There a
+    base leading back to the class (a cycle) is not counted, the class is placed
+    above it.
+    """
+    if depths is None:
+        depths = {}
+    if bases is None:
+        bases = attrgetter('__bases__')
+    depths.setdefault(root, 1)
     for cls in cls_list:
-        tree_dict[cls.__name__] = dict()
-        tree_dict[cls.__name__]['module'] = cls.__module__
-        tree_dict[cls.__name__]['dct'] = [attr.__name__ for attr in cls.__dict__.values() if isfunction(attr)]
-        tree_dict[cls.__name__]['row'] = max(len(path) for path in all_paths(cls))
-
-        if type in cls.__mro__:
-            tree_dict[cls.__name__]['superclasses'] = [sup.__name__ for sup in cls.__mro__[1:]]
-            tree_dict[cls.__name__]['ismetaclass'] = True
-            tree_dict[cls.__name__]['row'] = 3    # Place below than object and type
-            add_type_dtc = True
+        stack = [cls]
+        path = set()    # classes on the way from cls to the top of the stack
+        while stack:
+            top = stack[-1]
+            if top in depths:
+                stack.pop()
+                path.discard(top)
+                continue
+            path.add(top)
+            pending = [sup for sup in bases(top) if sup not in depths and sup not in path]
+            if pending:
+                stack.extend(pending)
+            else:
+                depths[top] = max((depths[sup] for sup in bases(top) if sup in depths), default=0) + 1
+                stack.pop()
+                path.discard(top)
+    return depths
+
+
+CLASS_KEYS = WeakKeyDictionary()    # {class: node key} of the classes met so far
+KEY_CLASSES = WeakValueDictionary()    # {node key: class}
+KEYS_LOCK = threading.Lock()    # a TreeLoader thread makes keys too
+
+
+def named_class(module, qualname):
+    """Return the class module.qualname refers to, None if the name does not lead to a class."""
+    obj = sys.modules.get(module)
+    try:
+        for part in qualname.split('.'):
+            obj = getattr(obj, part)
+    except Exception:
+        return None
+    return obj if isclass(obj) else None
+
+
+def class_key(cls):
+    """Return the node key of a class: its qualified name prefixed with the module.
+
+    The plain name belongs to the class it refers to (tokenize.TokenInfo). Other live
+    classes with that name (the namedtuple TokenInfo derives from) get '#' and a digest
+    of their bases and attribute names appended, so a key is the same in every run.
+    """
+    key = CLASS_KEYS.get(cls)
+    if key is not None:
+        return key
+    with KEYS_LOCK:
+        name = f'{cls.__module__}.{cls.__qualname__}'
+        named = named_class(cls.__module__, cls.__qualname__)
+        holder = KEY_CLASSES.get(name)
+        if named is not None and named is not cls:
+            key = suffixed_key(cls, name)
+        elif holder is None:
+            key = name
+        elif named is cls:
+            # met before its name was bound (or a reloaded module), the holder moves aside
+            moved = suffixed_key(holder, name)
+            CLASS_KEYS[holder] = moved
+            KEY_CLASSES[moved] = holder
+            key = name
         else:
-            tree_dict[cls.__name__]['superclasses'] = [sup.__name__ for sup in cls.__bases__]
-            tree_dict[cls.__name__]['ismetaclass'] = False
+            key = suffixed_key(cls, name)
+        CLASS_KEYS[cls] = key
+        KEY_CLASSES[key] = cls
+    return key
+
+
+def suffixed_key(cls, name):
+    parts = [f'{base.__module__}.{base.__qualname__}' for base in cls.__bases__] + sorted(cls.__dict__)
+    digest = blake2b('\0'.join(parts).encode(), digest_size=3).hexdigest()
+    key = base_key = f'{name}#{digest}'
+    number = 1
+    while KEY_CLASSES.get(key, cls) is not cls:
+        # identical twins, e.g. made twice by one factory function
+        number += 1
+        key = f'{base_key}.{number}'
+    return key
+
+
+def method_names(cls):
+    return [attr.__name__ for attr in cls.__dict__.values() if isfunction(attr)]
+
+
+def special_node(cls, row, superclasses):
+    return {'name': cls.__name__,
+            'module': cls.__module__,
+            'dct': method_names(cls),
+            'row': row,
+            'superclasses': superclasses,
+            'ismetaclass': False,
+            'metaclass': [],
+            'subclasses': []}
+
+
+def class_node(cls, depths, node=None):
+    """Return the node_info of one class, depths is the class_depths() of it.
+
+    A NodeInfo given as node is filled without 'dct', it is computed when needed.
+    """
+    if node is None:
+        node = dict()
+    node['name'] = cls.__name__
+    node['module'] = cls.__module__
+    if not isinstance(node, NodeInfo):
+        node['dct'] = method_names(cls)
+    node['row'] = depths[cls]
+
+    if type in cls.__mro__:
+        node['superclasses'] = [class_key(sup) for sup in cls.__mro__[1:]]
+        node['ismetaclass'] = True
+        node['row'] = 3    # Place below than object and type
+    else:
+        node['superclasses'] = [class_key(sup) for sup in cls.__bases__]
+        node['ismetaclass'] = False
 
-        if type in cls.__class__.__mro__ and object in cls.__bases__ and cls.__class__ not in (object, type):
-            tree_dict[cls.__name__]['metaclass'] = [cls.__class__.__name__]
-            tree_dict[cls.__name__]['row'] = 4    # Place below than object, type, and metaclass
-        else:
-            tree_dict[cls.__name__]['metaclass'] = []
+    if type in cls.__class__.__mro__ and object in cls.__bases__ and cls.__class__ not in (object, type):
+        node['metaclass'] = [class_key(cls.__class__)]
+        node['row'] = 4    # Place below than object, type, and metaclass
+    else:
+        node['metaclass'] = []
+
+    node['subclasses'] = []
+    if type not in cls.__mro__:
+        if cls.__subclasses__():
+            node['subclasses'] = [class_key(sub) for sub in cls.__subclasses__()]
+    return node
+
+
+class NodeInfo(dict):
+    """A node_info which computes its 'dct' (method names) on the first access.
+
+    The class is referenced weakly, a ClassTree must not keep collected classes alive.
+    """
+    __slots__ = ('cls',)
+
+    def __init__(self, cls):
+        dict.__init__(self)
+        self.cls = ref(cls)
+
+    def __missing__(self, key):
+        if key != 'dct':
+            raise KeyError(key)
+        cls = self.cls()
+        value = self['dct'] = method_names(cls) if cls is not None else []
+        return value
+
+
+NODE_FIELDS = ('name', 'module', 'dct', 'row', 'superclasses', 'ismetaclass', 'metaclass', 'subclasses')
+MEMBER_KINDS = ('methods', 'classmethods', 'staticmethods', 'properties', 'slots', 'attributes')
+
+
+def member_kind(value):
+    if isinstance(value, classmethod):
+        return 'classmethods'
+    if isinstance(value, staticmethod):
+        return 'staticmethods'
+    if isinstance(value, (property, GetSetDescriptorType)):
+        return 'properties'
+    if isinstance(value, MemberDescriptorType):
+        return 'slots'
+    if isroutine(value):
+        return 'methods'
+    return 'attributes'
+
+
+def class_members(cls):
+    """Return {kind: [(name, origin_key), ...]} for the MEMBER_KINDS of cls and 'mro': [key, ...].
+
+    The origin of a member is the first class of the MRO defining it, the one
+    attribute lookup finds.
+    """
+    members = {kind: [] for kind in MEMBER_KINDS}
+    seen = set()
+    for base in cls.__mro__:
+        origin = class_key(base)
+        for name, value in base.__dict__.items():
+            if name not in seen:
+                seen.add(name)
+                members[member_kind(value)].append((name, origin))
+    for kind in MEMBER_KINDS:
+        members[kind].sort()
+    members['mro'] = [class_key(base) for base in cls.__mro__]
+    return members
+
+
+def record_members(tree_dict, key):
+    """class_members() of a node without a live class: the 'dct' methods along the C3 MRO of the records."""
+    def bases(key):
+        return [sup for sup in tree_dict[key]['superclasses'] if sup in tree_dict]
+
+    # ancestors bases first, a base in the same or a lower row would close a cycle
+    depths = class_depths([key], bases=bases, root=OBJECT_KEY)
+    mros = {}
+    for ancestor in sorted(depths, key=depths.__getitem__):
+        if ancestor in tree_dict:
+            sups = [sup for sup in bases(ancestor) if depths[sup] < depths[ancestor]]
+            mros[ancestor] = c3_merge([[ancestor]] + [mros[sup] for sup in sups] + [sups])
+
+    members = {kind: [] for kind in MEMBER_KINDS}
+    seen = set()
+    for origin in mros[key]:
+        for name in tree_dict[origin]['dct']:
+            if name not in seen:
+                seen.add(name)
+                members['methods'].append((name, origin))
+    members['methods'].sort()
+    members['mro'] = mros[key]
+    return members
 
-        tree_dict[cls.__name__]['subclasses'] = []
-        if type not in cls.__mro__:
-            if cls.__subclasses__():
-                tree_dict[cls.__name__]['subclasses'] = [sub.__name__ for sub in cls.__subclasses__()]
+
+def inspect_class_tree(cls_list):
+    """Return {node_key: node_info} for every class of cls_list plus object (and type if needed).
+
+    The records are NodeInfo, the method names of 'dct' are only listed when used.
+    """
+    tree_dict = {}
+    add_type_dtc = False
+    depths = class_depths(cls_list)
+    for cls in cls_list:
+        node = tree_dict[class_key(cls)] = class_node(cls, depths, NodeInfo(cls))
+        add_type_dtc = add_type_dtc or node['ismetaclass']
 
     if add_type_dtc:
-        tree_dict['type'] = dict()
-        tree_dict['type']['module'] = type.__module__
-        tree_dict['type']['dct'] = [attr.__name__ for attr in type.__dict__.values() if isfunction(attr)]
-        tree_dict['type']['row'] = 2
-        tree_dict['type']['superclasses'] = ['object']
-        tree_dict['type']['subclasses'] = []
-        tree_dict['type']['ismetaclass'] = False
-        tree_dict['type']['metaclass'] = []
-
-    tree_dict['object'] = dict()
-    tree_dict['object']['module'] = object.__module__
-    tree_dict['object']['dct'] = [attr.__name__ for attr in object.__dict__.values() if isfunction(attr)]
-    tree_dict['object']['row'] = 1
-    tree_dict['object']['superclasses'] = []
-    tree_dict['object']['subclasses'] = []
-    tree_dict['object']['ismetaclass'] = False
-    tree_dict['object']['metaclass'] = []
-
-
-classes = []
-def find_all_classes(cls):
-    if cls is object or cls is type:
-        return
-    if type in cls.__class__.__mro__:
-        if cls.__class__ not in classes and cls.__class__ is not type:
-            classes.append(cls.__class__)
-    if cls not in classes:
-        classes.append(cls)
-    for sup in cls.__bases__:
-        if sup not in classes:
-            find_all_classes(sup)
-    for sub in cls.__subclasses__():
-        if sub not in classes:
-            find_all_classes(sub)
+        tree_dict[TYPE_KEY] = special_node(type, row=2, superclasses=[OBJECT_KEY])
+    tree_dict[OBJECT_KEY] = special_node(object, row=1, superclasses=[])
+
+    # a limited discovery leaves references to classes which are not in the tree
+    prune_references(tree_dict)
+    return tree_dict
+
+
+def prune_references(tree_dict):
+    for node in tree_dict.values():
+        for field in ('superclasses', 'subclasses', 'metaclass'):
+            node[field] = [key for key in node[field] if key in tree_dict]
+
+
+class ClassTree:
+    """Classes connected to root together with their node records and edges.
+
+    nodes is {node_key: node_info} as returned by inspect_class_tree(), edges is
+    a list of (subclass_key, superclass_key, kind) tuples, kind is 'base' or 'metaclass'.
+    Every tree owns its own data, so any number of trees can exist side by side.
+    Classes are referenced weakly, refresh() follows the classes defined and
+    collected while the program runs.
+    """
+    def __init__(self, root, max_depth=None, max_classes=None):
+        self.root = check_obj(root)
+        self.root_key = class_key(self.root)
+        self.max_depth = max_depth
+        self.max_classes = max_classes
+        classes = self.find_classes()
+        self.refs = WeakValueDictionary((class_key(cls), cls) for cls in classes)
+        # {node_key: len(__subclasses__())} seen by the last refresh
+        self.counts = {class_key(cls): len(cls.__subclasses__()) for cls in classes if type not in cls.__mro__}
+        if self.root is object:
+            self.counts[OBJECT_KEY] = len(object.__subclasses__())
+        self.set_nodes(inspect_class_tree(classes))
+
+    @classmethod
+    def from_nodes(cls, root_key, nodes, root=None, max_depth=None, max_classes=None):
+        """Make a tree from already inspected node records, e.g. loaded from a file."""
+        tree = cls.__new__(cls)
+        tree.root = root
+        tree.root_key = root_key
+        tree.max_depth = max_depth
+        tree.max_classes = max_classes
+        tree.refs = WeakValueDictionary()
+        tree.counts = {}
+        tree.set_nodes(nodes)
+        return tree
+
+    @property
+    def classes(self):
+        return list(self.refs.values())
+
+    def find_classes(self):
+        """Return the live classes of the tree, without object and type."""
+        if self.root is not object:
+            return find_all_classes(self.root, max_depth=self.max_depth, max_classes=self.max_classes)
+        # find_all_classes() does not walk the subclasses of object, every class is one
+        classes = []
+        for row, layer in iter_class_layers(object):
+            if self.max_depth is not None and row - 1 > self.max_depth:
+                break
+            classes.extend(cls for cls in layer if cls is not object and cls is not type)
+            if self.max_classes is not None and len(classes) >= self.max_classes:
+                del classes[self.max_classes:]
+                break
+        return classes
+
+    def find_class(self, key):
+        """Return the class of a node, None if it is not alive or the tree was loaded from records."""
+        if key == OBJECT_KEY:
+            return object
+        if key == TYPE_KEY:
+            return type
+        return self.refs.get(key)
+
+    def set_nodes(self, nodes):
+        self.nodes = nodes
+        self.edges = []
+        self.pending = {}    # {missing node key: [(referring key, field, its keys)]} of add_nodes()
+        self._parents = {key: [] for key in self.nodes}
+        self._children = {key: [] for key in self.nodes}
+        for key, node in self.nodes.items():
+            for sup in node['superclasses']:
+                self.add_edge(key, sup, 'base')
+            for meta in node['metaclass']:
+                self.add_edge(key, meta, 'metaclass')
+
+    def add_nodes(self, records):
+        """Add (node_key, node_info) records, e.g. from a TreeLoader, return the (added, changed) keys.
+
+        References to classes which are not in the tree yet wait in pending until the
+        class comes, then the edge is added to the earlier node.
+        """
+        added = set()
+        for key, info in records:
+            if key not in self.nodes:
+                self.nodes[key] = info
+                self._parents[key] = []
+                self._children[key] = []
+                added.add(key)
+        changed = set()
+        for key in added:
+            # nodes which came earlier and refer to this one get their edge now
+            for referrer, field, keys in self.pending.pop(key, ()):
+                if referrer in self.nodes:
+                    self.nodes[referrer][field][:] = [other for other in keys if other in self.nodes]
+                    self.add_edge(referrer, key, 'base' if field == 'superclasses' else 'metaclass')
+                    changed.add(referrer)
+        for key in added:
+            node = self.nodes[key]
+            for field in ('superclasses', 'metaclass'):
+                for other in node[field]:
+                    if other not in self.nodes:
+                        self.pending.setdefault(other, []).append((key, field, list(node[field])))
+        return added, changed | self.link_nodes(added)
+
+    def link_nodes(self, added):
+        """Add the edges of the added nodes, return the keys of nodes which got new subclasses."""
+        changed = set()
+        for key in added:
+            node = self.nodes[key]
+            for field in ('superclasses', 'subclasses', 'metaclass'):
+                node[field] = [other for other in node[field] if other in self.nodes]
+            for sup in node['superclasses']:
+                self.add_edge(key, sup, 'base')
+                info = self.nodes[sup]
+                if sup in added or info['ismetaclass'] or sup in (OBJECT_KEY, TYPE_KEY):
+                    continue
+                if key not in info['subclasses']:
+                    info['subclasses'].append(key)
+                    changed.add(sup)
+            for meta in node['metaclass']:
+                self.add_edge(key, meta, 'metaclass')
+        return changed
+
+    def add_edge(self, sub, sup, kind):
+        self.edges.append((sub, sup, kind))
+        if kind == 'base':
+            self._parents[sub].append(sup)
+            self._children[sup].append(sub)
+
+    def refresh(self):
+        """Bring the nodes up to date with classes defined or collected since the last call.
+
+        Returns the sets of (added, removed, changed) node keys. Apart from one
+        __subclasses__() call per known class, the work depends on the size of the
+        change. A tree without a live root (loaded from a file) never changes.
+        """
+        if self.root is None:
+            return set(), set(), set()
+        new = []
+        if not self.refs:
+            # loaded from the cache or a stream: find the class objects once
+            classes = self.find_classes()
+            self.refs.update((class_key(cls), cls) for cls in classes)
+            new = [cls for cls in classes if class_key(cls) not in self.nodes]
+        removed = {key for key in self.nodes if key not in self.refs} - {OBJECT_KEY, TYPE_KEY}
+        if (TYPE_KEY in self.nodes and any(self.nodes[key]['ismetaclass'] for key in removed) and
+                not any(info['ismetaclass'] for key, info in self.nodes.items() if key not in removed)):
+            removed.add(TYPE_KEY)    # the last metaclass is gone
+
+        seen = None
+        known = list(self.refs.items())
+        if self.root is object:    # new classes without other bases are only under object
+            known.append((OBJECT_KEY, object))
+        for key, cls in known:
+            if type in cls.__mro__:
+                continue
+            subclasses = cls.__subclasses__()
+            if len(subclasses) == self.counts.get(key) and not removed:
+                continue
+            self.counts[key] = len(subclasses)
+            if seen is None:
+                seen = {id(known) for known in self.refs.values()}
+            for sub in subclasses:
+                if id(sub) in seen:
+                    continue
+                limit = None
+                if self.max_classes is not None:
+                    limit = self.max_classes - len(self.refs) - len(new)
+                    if limit <= 0:
+                        break
+                new.extend(find_all_classes(sub, max_depth=self.max_depth, max_classes=limit, seen=seen))
+
+        added = {class_key(cls) for cls in new}
+        stale = removed | (added & self.nodes.keys())    # records to drop, redefined classes get new ones
+        changed = set()
+        for key in stale:
+            node = self.nodes.pop(key)
+            for other in {*node['superclasses'], *node['subclasses']} - stale:
+                if other in self.nodes:
+                    for field in ('superclasses', 'subclasses', 'metaclass'):
+                        if key in self.nodes[other][field]:
+                            self.nodes[other][field].remove(key)
+                            changed.add(other)
+        if stale:
+            self.edges = [edge for edge in self.edges if edge[0] not in stale and edge[1] not in stale]
+            for key in stale:
+                for sup in self._parents.pop(key):
+                    if sup not in stale:
+                        self._children[sup].remove(key)
+                for sub in self._children.pop(key):
+                    if sub not in stale:
+                        self._parents[sub].remove(key)
+        for key in removed - added:
+            self.counts.pop(key, None)
+
+        depths = class_depths(new)
+        for cls in new:
+            key = class_key(cls)
+            self.refs[key] = cls
+            if type not in cls.__mro__:
+                self.counts[key] = len(cls.__subclasses__())
+            self.nodes[key] = class_node(cls, depths)
+        if TYPE_KEY not in self.nodes and any(self.nodes[key]['ismetaclass'] for key in added):
+            self.nodes[TYPE_KEY] = special_node(type, row=2, superclasses=[OBJECT_KEY])
+            added.add(TYPE_KEY)
+        for key in added:
+            self._parents[key] = []
+            self._children[key] = []
+        changed |= self.link_nodes(added)
+        return added, removed - added, changed - added - removed
+
+    def iter_nodes(self):
+        return iter(self.nodes.items())
+
+    def iter_edges(self):
+        return iter(self.edges)
+
+    def key(self, cls_or_key):
+        return cls_or_key if isinstance(cls_or_key, str) else class_key(cls_or_key)
+
+    def parents(self, cls_or_key):
+        return list(self._parents[self.key(cls_or_key)])
+
+    def children(self, cls_or_key):
+        return list(self._children[self.key(cls_or_key)])
+
+    def depth(self, cls_or_key):
+        return self.nodes[self.key(cls_or_key)]['row']
+
+    def metaclass(self, cls_or_key):
+        metaclass = self.nodes[self.key(cls_or_key)]['metaclass']
+        return metaclass[0] if metaclass else None
+
+    def __getitem__(self, cls_or_key):
+        return self.nodes[self.key(cls_or_key)]
+
+    def __contains__(self, cls_or_key):
+        return self.key(cls_or_key) in self.nodes
+
+    def __iter__(self):
+        return iter(self.nodes)
+
+    def __len__(self):
+        return len(self.nodes)
+
+
+def find_all_classes(cls, max_depth=None, max_classes=None, seen=None):
+    """Return the list of classes connected to cls through bases, subclasses and metaclasses.
+
+    The order is the same depth-first order the recursive walk used to produce.
+    max_depth limits how many base/subclass steps are taken away from cls,
+    max_classes limits the total number of returned classes. seen is a set of
+    ids of already known classes to skip, it is updated with the found ones.
+    """
+    return list(iter_all_classes(cls, max_depth=max_depth, max_classes=max_classes, seen=seen))
+
+
+def iter_all_classes(cls, max_depth=None, max_classes=None, seen=None):
+    """Yield the classes of find_all_classes() one by one, while they are found."""
+    if seen is None:
+        seen = set()
+    seen.update((id(object), id(type)))
+    found = 0
+    stack = [(cls, 0)]
+    while stack:
+        cls, depth = stack.pop()
+        if id(cls) in seen:
+            continue
+        if max_classes is not None and found >= max_classes:
+            break
+        meta = cls.__class__
+        if type in meta.__mro__ and id(meta) not in seen:
+            seen.add(id(meta))
+            found += 1
+            yield meta
+        seen.add(id(cls))
+        if max_classes is not None and found >= max_classes:
+            break
+        found += 1
+        yield cls
+        if max_depth is not None and depth >= max_depth:
+            continue
+        # pushed in reverse so that bases are walked before subclasses, left to right
+        neighbours = list(cls.__bases__)
+        if type not in cls.__mro__:
+            neighbours.extend(cls.__subclasses__())
+        stack.extend((other, depth + 1) for other in reversed(neighbours) if id(other) not in seen)
+
+
+def iter_class_layers(root=object):
+    """Yield (row, classes) for the classes under root, one row after another.
+
+    A class comes in the row after the last of its bases, so rows are the same as
+    class_depths() gives when root is object. Only the current row and the classes
+    whose other bases are not reached yet are kept, not the whole tree.
+    """
+    waiting = {}    # {class: bases under root not yielded yet}
+    layer = [root]
+    row = class_depths([root])[root]
+    while layer:
+        yield row, layer
+        next_layer = []
+        for cls in layer:
+            for sub in type.__subclasses__(cls):
+                bases = waiting.get(sub)
+                if bases is None:
+                    bases = len(sub.__bases__) if root is object else sum(root in base.__mro__ for base in sub.__bases__)
+                if bases > 1:
+                    waiting[sub] = bases - 1
+                else:
+                    waiting.pop(sub, None)
+                    next_layer.append(sub)
+        layer = next_layer
+        row += 1
+
+
+class ClassStream:
+    """All classes under root as a stream of node records, for trees too big to hold.
+
+    iter_nodes() and iter_edges() walk the live classes again on every call,
+    records are NodeInfo with a lazy 'dct'. It is accepted by the exporters in place
+    of a ClassTree: json and dot consume it row by row, svg needs the whole tree
+    for the layout and collects it first.
+    """
+    def __init__(self, root=object):
+        self.root = check_obj(root)
+        self.root_key = class_key(self.root)
+
+    def iter_layers(self):
+        """Yield (row, [(node_key, node_info), ...])."""
+        root = self.root
+        for row, classes in iter_class_layers(root):
+            layer = []
+            for cls in classes:
+                if cls is object:
+                    info = special_node(object, row=1, superclasses=[])
+                elif cls is type:
+                    info = special_node(type, row=2, superclasses=[OBJECT_KEY])
+                else:
+                    info = class_node(cls, {cls: row}, NodeInfo(cls))
+                    if root is not object:
+                        # bases and metaclasses outside the stream have no nodes
+                        for field, classes in (('superclasses', cls.__mro__[1:] if info['ismetaclass'] else cls.__bases__),
+                                               ('metaclass', [cls.__class__] if info['metaclass'] else [])):
+                            info[field] = [class_key(other) for other in classes if root in other.__mro__]
+                layer.append((class_key(cls), info))
+            yield row, layer
+
+    def iter_nodes(self):
+        for row, layer in self.iter_layers():
+            yield from layer
+
+    def iter_edges(self):
+        for key, info in self.iter_nodes():
+            for sup in info['superclasses']:
+                yield key, sup, 'base'
+            for meta in info['metaclass']:
+                yield key, meta, 'metaclass'
+
+    def to_tree(self):
+        """Collect the stream into a ClassTree (holding every node)."""
+        return ClassTree.from_nodes(self.root_key, dict(self.iter_nodes()), root=self.root)
+
+
+class TreeLoader(threading.Thread):
+    """Discovers and inspects classes in a worker thread for MainWindow.load().
+
+    Without build the classes of root are sent while they are found: the ones of
+    ClassTree(root, max_depth, max_classes), or all classes row by row for object.
+    build is a function returning a ClassTree (e.g. a static or cached tree) whose
+    records are sent when it is done. The queue gets lists of (node_key, node_info),
+    then None, or the exception which stopped the worker.
+    """
+    batch_size = 500
+
+    def __init__(self, root=None, build=None, max_depth=None, max_classes=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.root = None if root is None else check_obj(root)
+        self.build = build
+        self.max_depth = max_depth
+        self.max_classes = max_classes
+        self.result = None    # the ClassTree made by build
+        self.queue = Queue()
+        self.cancelled = threading.Event()    # tkinter's Event is the event of a binding
+
+    def tree(self):
+        """Return the ClassTree a window starts with, it has only the object node."""
+        nodes = {OBJECT_KEY: special_node(object, row=1, superclasses=[])}
+        root_key = OBJECT_KEY if self.root is None else class_key(self.root)
+        return ClassTree.from_nodes(root_key, nodes, root=self.root, max_depth=self.max_depth,
+                                    max_classes=self.max_classes)
+
+    def iter_nodes(self):
+        """Yield the records of ClassTree(root) (without object) while the classes are found."""
+        depths = {}
+        has_type = False
+        for cls in iter_all_classes(self.root, max_depth=self.max_depth, max_classes=self.max_classes):
+            class_depths([cls], depths)
+            info = class_node(cls, depths, NodeInfo(cls))
+            if info['ismetaclass'] and not has_type:
+                has_type = True
+                yield TYPE_KEY, special_node(type, row=2, superclasses=[OBJECT_KEY])
+            yield class_key(cls), info
+
+    def run(self):
+        try:
+            if self.build is None and self.root is object:
+                records = ClassStream(object).iter_nodes()
+            elif self.build is None:
+                records = self.iter_nodes()
+            else:
+                self.result = self.build()
+                records = iter(self.result.nodes.items())
+            batch = []
+            for record in records:
+                if self.cancelled.is_set():
+                    return
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    self.queue.put(batch)
+                    batch = []
+            self.queue.put(batch)
+            self.queue.put(None)
+        except Exception as error:
+            self.queue.put(error)
+
+    def adopt(self, tree):
+        """Give the loaded tree the root and limits of the built one, refresh() needs them."""
+        if self.result is not None:
+            tree.root = self.result.root
+            tree.root_key = self.result.root_key
+            tree.max_depth = self.result.max_depth
+            tree.max_classes = self.result.max_classes
 
 
 def check_obj(obj):
@@ -556,16 +2916,824 @@ def check_obj(obj):
     else:
         raise TypeError('argument must be a class or an instance of class')
 
+################################################################################
+# STATIC (IMPORT-FREE) CLASS TREES FROM SOURCE FILES:
+################################################################################
+def dotted_name(node):
+    """Return 'a.b.C' for a Name/Attribute chain (Generic[T] gives 'Generic'), None otherwise."""
+    if isinstance(node, ast.Subscript):
+        node = node.value
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return '.'.join(reversed(parts))
+
+
+def module_name_of(path):
+    """Return the dotted module name of a source file, following the __init__.py packages up."""
+    directory, filename = os.path.split(os.path.abspath(path))
+    parts = [] if filename == '__init__.py' else [filename[:-3]]
+    while os.path.isfile(os.path.join(directory, '__init__.py')):
+        directory, package = os.path.split(directory)
+        parts.append(package)
+    return '.'.join(reversed(parts))
+
+
+def scan_source(job):
+    """Parse one file, return a picklable summary of its imports and classes.
+
+    scope maps every module level name to ('import', absolute dotted name),
+    ('class', qualname) or ('alias', dotted expression); classes is a list of
+    (qualname, base expressions, metaclass expression, function names, bound).
+    bound has the scope entries of the base and metaclass names as they were at
+    the class statement, where they differ from the final scope: in
+    "from .base import Foo; class Foo(Foo)" the base is the imported Foo.
+    Runs in the worker processes of SourceScanner.
+    """
+    path, module = job
+    summary = {'module': module, 'path': path, 'scope': {}, 'stars': [], 'classes': [], 'error': None}
+    try:
+        with open(path, 'rb') as fp:
+            module_ast = ast.parse(fp.read(), filename=path)
+    except (OSError, SyntaxError, ValueError) as exc:
+        summary['error'] = f'{type(exc).__name__}: {exc}'
+        return summary
+
+    package = module if path.endswith('__init__.py') else module.rpartition('.')[0]
+    scope = summary['scope']
+    for statement in module_ast.body:
+        if isinstance(statement, ast.ClassDef):
+            scan_class(statement, scope, summary['classes'])
+            scope[statement.name] = ('class', statement.name)
+        elif isinstance(statement, ast.Import):
+            for alias in statement.names:
+                if alias.asname:
+                    scope[alias.asname] = ('import', alias.name)
+                else:
+                    head = alias.name.partition('.')[0]
+                    scope[head] = ('import', head)
+        elif isinstance(statement, ast.ImportFrom):
+            source = statement.module or ''
+            if statement.level:
+                base = package.split('.') if package else []
+                base = base[:len(base) - statement.level + 1]
+                source = '.'.join(base + ([source] if source else []))
+            for alias in statement.names:
+                if alias.name == '*':
+                    summary['stars'].append(source)
+                else:
+                    scope[alias.asname or alias.name] = ('import', f'{source}.{alias.name}')
+        elif isinstance(statement, ast.Assign) and len(statement.targets) == 1:
+            target, value = statement.targets[0], dotted_name(statement.value)
+            if isinstance(target, ast.Name) and value and not isinstance(statement.value, ast.Subscript):
+                scope[target.id] = ('alias', value)
+
+    for i, (qualname, bases, metaclass, functions, bound) in enumerate(summary['classes']):
+        bound = {head: entry for head, entry in bound.items() if scope.get(head) != entry}
+        summary['classes'][i] = (qualname, bases, metaclass, functions, bound)
+    return summary
+
+
+def scan_class(statement, scope, classes):
+    """Append the module level class and its nested classes to classes, see scan_source()."""
+    bound = {}    # the names are looked up in the scope before the class statement
+    stack = [(statement, '')]
+    while stack:
+        statement, prefix = stack.pop()
+        if not isinstance(statement, ast.ClassDef):
+            continue
+        qualname = prefix + statement.name
+        bases = [name for name in map(dotted_name, statement.bases) if name]
+        metaclass = None
+        for keyword in statement.keywords:
+            if keyword.arg == 'metaclass':
+                metaclass = dotted_name(keyword.value)
+        for name in bases + [metaclass] if metaclass else bases:
+            head = name.partition('.')[0]
+            if head in scope:
+                bound[head] = scope[head]
+        functions = []
+        for item in statement.body:
+            if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                decorators = {dotted_name(decorator) for decorator in item.decorator_list}
+                # wrapped methods are not functions in cls.__dict__, like inspect_class_tree sees it
+                if not decorators & {'staticmethod', 'classmethod', 'property'}:
+                    functions.append(item.name)
+        classes.append((qualname, bases, metaclass, functions, bound))
+        stack.extend((item, qualname + '.') for item in reversed(statement.body))
+
+
+class SourceScanner:
+    """Builds class trees from Python source files with ast, without importing them.
+
+    Files are parsed in a process pool. Their summaries are cached on disk (as JSON)
+    by path, mtime and size, so a repeated scan only parses the changed files. Base and
+    metaclass names are resolved through imports, aliases, relative and star
+    imports of the scanned modules. Classes from outside the scanned files become
+    nodes right under object (builtins are taken from the running interpreter).
+    """
+    parallel_from = 32    # smaller scans are parsed in this process
+    format_version = 3    # of the cached summaries
+
+    def __init__(self, paths, workers=None, cache_dir=None, use_cache=True):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.workers = workers
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.use_cache = use_cache
+        self.summaries = []
+        self.modules = {}    # {module name: summary}
+        self.keys = set()    # node keys of all scanned classes
+        self.errors = {}    # {path: parse error}
+
+    def files(self):
+        """Return sorted [(path, module name)] of all .py files under the paths."""
+        found = []
+        for path in self.paths:
+            if os.path.isfile(path):
+                found.append(os.path.abspath(path))
+                continue
+            for directory, dirs, filenames in os.walk(path):
+                dirs[:] = sorted(name for name in dirs if not name.startswith('.') and name != '__pycache__')
+                found.extend(os.path.abspath(os.path.join(directory, name))
+                             for name in filenames if name.endswith('.py'))
+        return [(path, module_name_of(path)) for path in sorted(set(found))]
+
+    def index_path(self):
+        digest = blake2b(digest_size=16)
+        digest.update(f'{self.format_version}\0'.encode())
+        for path in sorted(map(os.path.abspath, self.paths)):
+            digest.update(f'{path}\0'.encode())
+        return os.path.join(self.cache_dir, digest.hexdigest() + '.sources')
+
+    def load_index(self):
+        if not self.use_cache:
+            return {}
+        try:
+            with open(self.index_path(), 'rb') as fp:
+                index = json.loads(zlib.decompress(fp.read()))
+        except (OSError, zlib.error, ValueError):
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def save_index(self, index):
+        if not self.use_cache:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.index_path()
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as fp:
+            fp.write(zlib.compress(json.dumps(index, separators=(',', ':')).encode()))
+        os.replace(temp_path, path)
+
+    def scan(self):
+        """Parse the files (changed ones only if cached) and return their summaries."""
+        index = self.load_index()
+        new_index = {}
+        summaries = {}
+        jobs = []
+        for path, module in self.files():
+            stat = os.stat(path)
+            stamp = [stat.st_mtime_ns, stat.st_size, module]
+            cached = index.get(path)
+            if isinstance(cached, list) and cached[0] == stamp and isinstance(cached[1], dict):
+                summaries[path] = cached[1]
+                new_index[path] = cached
+            else:
+                jobs.append((path, module))
+                new_index[path] = [stamp, None]
+
+        if len(jobs) >= self.parallel_from and self.workers != 1:
+            with ProcessPoolExecutor(self.workers) as executor:
+                parsed = list(executor.map(scan_source, jobs, chunksize=max(1, len(jobs) // 256)))
+        else:
+            parsed = [scan_source(job) for job in jobs]
+        for summary in parsed:
+            summaries[summary['path']] = summary
+            new_index[summary['path']] = [new_index[summary['path']][0], summary]
+        if jobs or len(new_index) != len(index):
+            self.save_index(new_index)
+
+        self.summaries = [summaries[path] for path in sorted(summaries)]
+        self.modules = {summary['module']: summary for summary in self.summaries}
+        self.keys = {f"{summary['module']}.{qualname}"
+                     for summary in self.summaries for qualname, *_ in summary['classes']}
+        self.errors = {summary['path']: summary['error'] for summary in self.summaries if summary['error']}
+        return self.summaries
+
+    def resolve(self, module, dotted, prefix='', depth=0, bound=None):
+        """Return the node key of the class which dotted names in module (prefix - enclosing class).
+
+        bound overrides the module scope with the names bound at the class statement.
+        """
+        if prefix and f'{module}.{prefix}{dotted}' in self.keys:
+            return f'{module}.{prefix}{dotted}'
+        head, _, rest = dotted.partition('.')
+        summary = self.modules.get(module)
+        target = None
+        if summary is not None:
+            entry = bound[head] if bound and head in bound else summary['scope'].get(head)
+            if entry is not None:
+                kind, value = entry
+                if kind == 'alias':
+                    if depth < 10 and value != dotted:
+                        return self.resolve(module, value + ('.' + rest if rest else ''), depth=depth + 1)
+                    return value
+                target = f'{module}.{value}' if kind == 'class' else value
+            else:
+                for star in summary['stars']:
+                    if self.exports(star, head):
+                        return self.resolve(star, dotted, depth=depth + 1) if depth < 10 else dotted
+        if target is None:
+            if isclass(getattr(builtins, head, None)) and not rest:
+                return f'builtins.{head}'
+            target = head
+        return self.canonical(target + ('.' + rest if rest else ''), depth)
+
+    def exports(self, module, name, depth=0):
+        """Whether a star import of module brings name, also through the star imports of module."""
+        summary = self.modules.get(module)
+        if summary is None:
+            return False
+        if name in summary['scope']:
+            return True
+        return depth < 10 and any(self.exports(star, name, depth + 1) for star in summary['stars'])
+
+    def canonical(self, dotted, depth=0):
+        """Follow re-exports ('pkg.Name' imported into pkg/__init__.py) to the defining module."""
+        if dotted in self.keys:
+            return dotted
+        parts = dotted.split('.')
+        for i in range(len(parts) - 1, 0, -1):
+            module = '.'.join(parts[:i])
+            if module in self.modules:
+                if depth < 10:
+                    return self.resolve(module, '.'.join(parts[i:]), depth=depth + 1)
+                break
+        return dotted
+
+    def tree(self, root=None, max_depth=None, max_classes=None):
+        """Return a ClassTree of the classes connected to root (a node key) or of all classes.
+
+        The limits are those of find_all_classes(), without root max_depth counts rows
+        below object.
+        """
+        if not self.summaries:
+            self.scan()
+        bases = {}    # {node key: [base keys]}
+        origins = {}    # {node key: (module, qualname)}
+        metaclasses = {}
+        functions = {}
+        for summary in self.summaries:
+            module = summary['module']
+            for qualname, base_names, metaclass, names, bound in summary['classes']:
+                key = f'{module}.{qualname}'
+                prefix = qualname.rpartition('.')[0]
+                prefix = prefix + '.' if prefix else ''
+                resolved = [self.resolve(module, name, prefix, bound=bound) for name in base_names]
+                bases[key] = [sup for sup in resolved if sup != key] or [OBJECT_KEY]
+                origins[key] = (module, qualname)
+                if metaclass:
+                    metaclasses[key] = self.resolve(module, metaclass, prefix, bound=bound)
+                functions[key] = names
+
+        # classes defined outside the scanned sources
+        stack = [(key, False) for keys in bases.values() for key in keys]
+        stack.extend((key, True) for key in metaclasses.values())
+        while stack:
+            key, is_metaclass = stack.pop()
+            if key in bases or key == OBJECT_KEY:
+                continue
+            module, _, name = key.rpartition('.')
+            origins[key] = (module, name)
+            live = getattr(builtins, name, None) if module == 'builtins' else None
+            if isclass(live):
+                bases[key] = [class_key(sup) for sup in live.__bases__]
+                functions[key] = method_names(live)
+                stack.extend((sup, False) for sup in bases[key])
+            else:
+                # an unknown class given as metaclass= must be derived from type
+                bases[key] = [TYPE_KEY] if is_metaclass else [OBJECT_KEY]
+                functions[key] = []
+                stack.extend((sup, False) for sup in bases[key])
+        bases[OBJECT_KEY] = []
+
+        depths = class_depths(bases, bases=bases.__getitem__, root=OBJECT_KEY)
+        # a base in the same or a lower row closes a cycle of wrongly resolved names
+        bases = {key: [sup for sup in sups if depths[sup] < depths[key]] or [OBJECT_KEY]
+                 for key, sups in bases.items()}
+        bases[OBJECT_KEY] = []
+        depths = class_depths(bases, bases=bases.__getitem__, root=OBJECT_KEY)
+        order = sorted(bases, key=depths.__getitem__)    # bases before their subclasses
+        mros = {}
+        metas = {}    # like cls.__class__ at runtime: the explicit metaclass or the one of the first base having it
+        for key in order:
+            mros[key] = c3_merge([[key]] + [mros[sup] for sup in bases[key]] + [bases[key]])
+            metas[key] = metaclasses.get(key) or next(
+                (metas[sup] for sup in bases[key] if metas[sup] != TYPE_KEY), TYPE_KEY)
+
+        tree_dict = {}
+        add_type = False
+        for key in bases:
+            if key == OBJECT_KEY:
+                continue
+            module, qualname = origins[key]
+            node = tree_dict[key] = {'name': qualname.rpartition('.')[2],
+                                     'module': module, 'dct': functions[key], 'row': depths[key]}
+            ancestors = mros[key][1:]
+            if TYPE_KEY in ancestors:
+                node['superclasses'] = ancestors
+                node['ismetaclass'] = True
+                node['row'] = 3
+                add_type = True
+            else:
+                node['superclasses'] = list(bases[key])
+                node['ismetaclass'] = False
+            meta = metaclasses.get(key)
+            if meta and meta != TYPE_KEY and OBJECT_KEY in bases[key]:
+                node['metaclass'] = [meta]
+                node['row'] = 4
+            else:
+                node['metaclass'] = []
+            node['subclasses'] = []
+        for key, node in tree_dict.items():
+            if not node['ismetaclass']:
+                for sup in bases[key]:
+                    if sup in tree_dict and not tree_dict[sup]['ismetaclass']:
+                        tree_dict[sup]['subclasses'].append(key)
+        tree_dict.pop(TYPE_KEY, None)
+        if add_type:
+            tree_dict[TYPE_KEY] = special_node(type, row=2, superclasses=[OBJECT_KEY])
+        tree_dict[OBJECT_KEY] = special_node(object, row=1, superclasses=[])
+
+        if root is not None:
+            tree_dict = connected_nodes(tree_dict, self.canonical(root), lambda key: metas.get(key, TYPE_KEY),
+                                        max_depth=max_depth, max_classes=max_classes)
+        elif max_depth is not None or max_classes is not None:
+            keys = [key for key in sorted(tree_dict, key=lambda key: tree_dict[key]['row'])
+                    if key not in (OBJECT_KEY, TYPE_KEY) and (max_depth is None or depths[key] <= max_depth + 1)]
+            keys = set(keys[:max_classes] if max_classes is not None else keys)
+            tree_dict = {key: node for key, node in tree_dict.items()
+                         if key in keys or key == OBJECT_KEY or key == TYPE_KEY and any(
+                             tree_dict[other]['ismetaclass'] for other in keys)}
+        prune_references(tree_dict)
+        return ClassTree.from_nodes(root or OBJECT_KEY, tree_dict, max_depth=max_depth, max_classes=max_classes)
+
+
+def c3_merge(sequences):
+    """C3 linearization of [[cls], mro(base_1), ..., [base_1, ...]], depth-first order if it fails."""
+    sequences = [sequence for sequence in sequences if sequence]
+    heads = [0] * len(sequences)    # position of the head of every sequence
+    tails = Counter(key for sequence in sequences for key in sequence[1:])    # keys behind the heads
+    result = []
+    while True:
+        active = [i for i, sequence in enumerate(sequences) if heads[i] < len(sequence)]
+        if not active:
+            return result
+        for i in active:
+            head = sequences[i][heads[i]]
+            if not tails[head]:
+                break
+        else:
+            # inconsistent hierarchy (e.g. a wrongly resolved name), keep the first occurrences
+            seen = set(result)
+            for i in active:
+                for key in sequences[i][heads[i]:]:
+                    if key not in seen:
+                        seen.add(key)
+                        result.append(key)
+            return result
+        result.append(head)
+        for i in active:
+            sequence = sequences[i]
+            if sequence[heads[i]] == head:
+                heads[i] += 1
+                if heads[i] < len(sequence):
+                    tails[sequence[heads[i]]] -= 1
+
+
+def connected_nodes(tree_dict, root_key, metaclass_of=None, max_depth=None, max_classes=None):
+    """Return the part of tree_dict which find_all_classes would discover from root_key.
+
+    metaclass_of(key) gives the metaclass key of a class, by default its metaclass edge.
+    """
+    if root_key not in tree_dict:
+        raise KeyError(f'class {root_key!r} not found in the scanned sources')
+    found = {}
+    stack = [(root_key, 0)]
+    while stack:
+        key, depth = stack.pop()
+        if key in found or key in (OBJECT_KEY, TYPE_KEY):
+            continue
+        if max_classes is not None and len(found) >= max_classes:
+            break
+        node = tree_dict[key]
+        metas = [metaclass_of(key)] if metaclass_of is not None else node['metaclass']
+        for meta in metas:
+            if meta in tree_dict and meta != TYPE_KEY:
+                found.setdefault(meta, tree_dict[meta])
+        found[key] = node
+        if max_depth is None or depth < max_depth:
+            stack.extend((other, depth + 1) for other in reversed(node['superclasses'] + node['subclasses']))
+    if max_classes is not None:
+        found = dict(list(found.items())[:max_classes])
+    for key in (TYPE_KEY, OBJECT_KEY):
+        if key in tree_dict and (key == OBJECT_KEY or any(node['ismetaclass'] for node in found.values())):
+            found[key] = tree_dict[key]
+    return {key: dict(node) for key, node in found.items()}
+
+
+def static_tree(paths, root=None, workers=None, cache=None, max_depth=None, max_classes=None):
+    """Return the ClassTree of root (node key 'module.Qual.Name' or None for all classes) from sources.
+
+    With cache (True - the default directory, or a TreeCache) the parsed files are kept on disk.
+    """
+    scanner = SourceScanner(paths, workers=workers, cache_dir=getattr(cache, 'directory', None),
+                            use_cache=bool(cache))
+    scanner.scan()
+    return scanner.tree(root, max_depth=max_depth, max_classes=max_classes)
+
+
+################################################################################
+# PERSISTENT CACHE OF INSPECTED TREES:
+################################################################################
+def default_cache_dir():
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'pyclasstree')
+
+
+def module_stamp(module_name):
+    """Return (version, mtime_ns, size) of a module source file, None parts if unknown."""
+    module = sys.modules.get(module_name)
+    path = getattr(module, '__file__', None)
+    if module is None:
+        try:
+            spec = find_spec(module_name)
+        except (ImportError, ValueError):
+            spec = None
+        path = spec.origin if spec is not None else None
+    package = sys.modules.get(module_name.partition('.')[0])
+    version = getattr(package, '__version__', None)
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return str(version), None, None
+    return str(version), stat.st_mtime_ns, stat.st_size
+
+
+class TreeCache:
+    """On-disk cache of inspected trees: warm runs skip find_all_classes and inspect_class_tree.
+
+    An entry is found by the root class and the discovery budgets. It is valid while
+    every module of its classes is imported and its version, mtime and size are
+    unchanged, and while its classes have as many __subclasses__() as when it was
+    stored (a module imported later may subclass one of them). Entries are zlib
+    compressed JSON, a shared directory cannot run code like a pickle could. The least
+    recently used entries are removed when the directory grows over max_bytes.
+    """
+    format_version = 3
+    suffix = '.tree'
+
+    def __init__(self, directory=None, max_bytes=64 * 2 ** 20):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def path(self, root, max_depth=None, max_classes=None):
+        digest = blake2b(digest_size=16)
+        for part in (class_key(root), root.__module__, max_depth, max_classes, sys.version):
+            digest.update(f'{part}\0'.encode())
+        return os.path.join(self.directory, digest.hexdigest() + self.suffix)
+
+    def load(self, root, max_depth=None, max_classes=None):
+        """Return the cached ClassTree of root or None if it is missing or stale."""
+        path = self.path(root, max_depth, max_classes)
+        try:
+            with open(path, 'rb') as fp:
+                data = json.loads(zlib.decompress(fp.read()))
+            if data['format'] != self.format_version:
+                return None
+            if any(name not in sys.modules or list(module_stamp(name)) != stamp
+                   for name, stamp in data['stamps'].items()):
+                return None
+            for module, qualname, count in data['counts']:
+                cls = named_class(module, qualname)
+                if cls is None or len(cls.__subclasses__()) != count:
+                    return None
+            nodes = self.decode(data)
+        except (OSError, zlib.error, ValueError, KeyError, IndexError, TypeError):
+            return None
+        os.utime(path)    # mark as recently used for the eviction
+        return ClassTree.from_nodes(data['root'], nodes, root=root, max_depth=max_depth, max_classes=max_classes)
+
+    def store(self, tree, max_depth=None, max_classes=None):
+        os.makedirs(self.directory, exist_ok=True)
+        modules = {info['module'] for info in tree.nodes.values()} | {tree.root.__module__}
+        data = {'format': self.format_version,
+                'root': tree.root_key,
+                'stamps': {name: module_stamp(name) for name in sorted(modules)},
+                'counts': self.subclass_counts(tree)}
+        data.update(self.encode(tree.nodes))
+        path = self.path(tree.root, max_depth, max_classes)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, 'wb') as fp:
+            fp.write(zlib.compress(json.dumps(data, separators=(',', ':')).encode()))
+        os.replace(temp_path, path)
+        self.evict()
+
+    def get(self, root, max_depth=None, max_classes=None):
+        """Return the tree of root from the cache, inspecting and storing it on a miss."""
+        root = check_obj(root)
+        tree = self.load(root, max_depth, max_classes)
+        if tree is None:
+            tree = ClassTree(root, max_depth=max_depth, max_classes=max_classes)
+            self.store(tree, max_depth, max_classes)
+        return tree
+
+    @staticmethod
+    def subclass_counts(tree):
+        # [(module, qualname, len(__subclasses__())), ...] of the classes found again by name on load
+        counts = []
+        for key, count in tree.counts.items():
+            cls = tree.find_class(key)
+            if cls is not None and named_class(cls.__module__, cls.__qualname__) is cls:
+                counts.append((cls.__module__, cls.__qualname__, count))
+        return counts
+
+    @staticmethod
+    def encode(nodes):
+        # node keys are stored once and referenced by index from the edge lists
+        keys = list(nodes)
+        index = {key: i for i, key in enumerate(keys)}
+        records = [(info['name'], info['module'], info['dct'], info['row'], info['ismetaclass'],
+                    [index[key] for key in info['superclasses']],
+                    [index[key] for key in info['subclasses']],
+                    [index[key] for key in info['metaclass']])
+                   for info in nodes.values()]
+        return {'keys': keys, 'records': records}
+
+    @staticmethod
+    def decode(data):
+        keys = data['keys']
+        nodes = {}
+        for key, (name, module, dct, row, ismetaclass, sups, subs, meta) in zip(keys, data['records']):
+            nodes[key] = {'name': name,
+                          'module': module,
+                          'dct': dct,
+                          'row': row,
+                          'superclasses': [keys[i] for i in sups],
+                          'ismetaclass': ismetaclass,
+                          'metaclass': [keys[i] for i in meta],
+                          'subclasses': [keys[i] for i in subs]}
+        return nodes
+
+    def evict(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for mtime, size, path in entries)
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.suffix):
+                os.remove(entry.path)
+
+
+################################################################################
+# DIFF OF TWO VERSIONS OF A CLASS TREE:
+################################################################################
+DIFF_KINDS = ('added', 'removed', 'reparented', 'changed')
+DIFF_COLORS = {'added': '#3CB371', 'removed': '#E9967A', 'reparented': '#DA70D6', 'changed': '#87CEEB',
+               'context': '#8C8C8C'}
+
+
+def load_snapshot(path):
+    """Return the ClassTree of a JSON file written by write_json (pyclasstree obj -o tree.json)."""
+    with open(path, encoding='utf-8') as fp:
+        data = json.load(fp)
+    return ClassTree.from_nodes(data['root'], data['nodes'])
+
+
+def node_fingerprint(info):
+    """Return the hashes of the bases (superclasses and metaclass, in order) and of the method names of a record."""
+    bases = blake2b('\0'.join(info['superclasses'] + info['metaclass']).encode(), digest_size=8).digest()
+    methods = blake2b('\0'.join(sorted(info['dct'])).encode(), digest_size=8).digest()
+    return bases, methods
+
+
+def diff_trees(old, new):
+    """Compare two ClassTrees, live or loaded by load_snapshot(), return (changes, tree).
+
+    changes is {node_key: kind}, kind is one of DIFF_KINDS: 'reparented' classes got
+    other bases or metaclass, 'changed' ones only another set of methods. tree holds
+    the changed classes with their ancestors from both versions, its records have
+    a 'diff' field (a kind or 'context') and a 'diff_detail' text; it is None
+    without changes. Nodes are compared by fingerprints, the work is linear.
+    """
+    old_nodes, new_nodes = old.nodes, new.nodes
+    changes = {}
+    details = {}
+    for key, info in new_nodes.items():
+        before = old_nodes.get(key)
+        if before is None:
+            changes[key] = 'added'
+            continue
+        (old_bases, old_methods), (new_bases, new_methods) = node_fingerprint(before), node_fingerprint(info)
+        detail = []
+        if old_bases != new_bases:
+            changes[key] = 'reparented'
+            detail.append(f"bases: {', '.join(before['superclasses'] + before['metaclass'])} -> "
+                          f"{', '.join(info['superclasses'] + info['metaclass'])}")
+        if old_methods != new_methods:
+            changes.setdefault(key, 'changed')
+            added, removed = set(info['dct']) - set(before['dct']), set(before['dct']) - set(info['dct'])
+            detail.append('methods: ' + ' '.join([f'+{name}' for name in sorted(added)] +
+                                                 [f'-{name}' for name in sorted(removed)]))
+        if detail:
+            details[key] = '\n'.join(detail)
+    for key in old_nodes.keys() - new_nodes.keys():
+        changes[key] = 'removed'
+    if not changes:
+        return changes, None
+
+    # the changed classes and everything above them, in both versions
+    merged = {}
+    stack = list(changes)
+    while stack:
+        key = stack.pop()
+        if key in merged:
+            continue
+        records = [nodes[key] for nodes in (new_nodes, old_nodes) if key in nodes]
+        record = {field: records[0][field] for field in NODE_FIELDS}
+        for field in ('superclasses', 'subclasses', 'metaclass'):
+            record[field] = list(dict.fromkeys(other for info in records for other in info[field]))
+        record['diff'] = changes.get(key, 'context')
+        record['diff_detail'] = details.get(key, '')
+        merged[key] = record
+        stack.extend(record['superclasses'] + record['metaclass'])
+    prune_references(merged)
+
+    # a class under the bases of both versions must stay below all of them,
+    # one pass with the bases first (a cycle of both versions is cut by class_depths)
+    depths = class_depths(merged, bases=lambda key: merged[key]['superclasses'], root=OBJECT_KEY)
+    for key in sorted(merged, key=depths.__getitem__):
+        record = merged[key]
+        if record['ismetaclass'] or not record['superclasses']:    # metaclasses share one row
+            continue
+        record['row'] = max(record['row'], max(merged[sup]['row'] + 1 for sup in record['superclasses']))
+    root_key = new.root_key if new.root_key in merged else OBJECT_KEY
+    return changes, ClassTree.from_nodes(root_key, merged)
+
+
+def build_tree(obj, max_depth=None, max_classes=None, cache=None):
+    """Return the ClassTree of obj, through a TreeCache if cache is given (True - default one)."""
+    if cache is True:
+        cache = TreeCache()
+    if cache:
+        return cache.get(obj, max_depth=max_depth, max_classes=max_classes)
+    return ClassTree(obj, max_depth=max_depth, max_classes=max_classes)
+
+
+def load_object(spec):
+    """Import 'module:Qual.Name' or 'module.Name' and return the object."""
+    if ':' in spec:
+        module_name, attrs = spec.split(':', 1)
+    else:
+        module_name, _, attrs = spec.rpartition('.')
+        if not module_name:
+            module_name, attrs = 'builtins', spec
+    obj = import_module(module_name)
+    for attr in attrs.split('.'):
+        obj = getattr(obj, attr)
+    return obj
+
+
 # main function
-def drawtree(obj):
-    cls = check_obj(obj)
-    find_all_classes(cls)
-    inspect_class_tree(classes)
+def drawtree(obj, max_depth=None, max_classes=None, layout=None, virtual=None, cache=None, watch=None,
+             profile=None, progress=None, bundle=False, background=False):
+    """Open a window with the class tree of obj (a class, an instance, a ClassTree or a TreeLoader).
+
+    With background the window opens at once and the classes come from a TreeLoader.
+    """
+    loader = None
+    if isinstance(obj, TreeLoader):
+        loader = obj
+    elif background and not isinstance(obj, ClassTree):
+        if cache:
+            loader = TreeLoader(build=lambda: build_tree(obj, max_depth=max_depth, max_classes=max_classes,
+                                                         cache=cache))
+        else:
+            loader = TreeLoader(obj, max_depth=max_depth, max_classes=max_classes)
+    if loader is not None:
+        tree = loader.tree()
+        if virtual is None:
+            virtual = True    # the size of the tree is not known yet
+    elif isinstance(obj, ClassTree):
+        tree = obj
+    else:
+        tree = build_tree(obj, max_depth=max_depth, max_classes=max_classes, cache=cache)
 
     root = Tk()
-    MainWindow(tree=tree_dict, parent=root)
+    window = MainWindow(tree=tree, parent=root, layout=layout, virtual=virtual, profile=bool(profile),
+                        progress=progress, bundle=bundle)
+    if loader is not None:
+        window.load(loader)
+    if watch:
+        window.watch(watch)    # poll for new subclasses every watch ms
     root.mainloop()
+    if isinstance(profile, (str, os.PathLike)):
+        window.profiler.dump(profile)    # profile is a trace file name
+
+
+def main(argv=None):
+    parser = ArgumentParser(prog='pyclasstree', description='Draw or export a Python class tree.')
+    parser.add_argument('obj', nargs='?',
+                        help="class to start from: 'module:Qual.Name' or 'module.Name' "
+                             "(default tkinter:Frame, or all classes with --source)")
+    parser.add_argument('-o', '--output',
+                        help="write the tree to this file ('-' for stdout) instead of opening a window")
+    parser.add_argument('-f', '--format', choices=sorted(EXPORTERS),
+                        help='export format, by default taken from the output file extension')
+    parser.add_argument('-l', '--layout', choices=sorted(LAYOUTS), default='layered')
+    parser.add_argument('--max-depth', type=int)
+    parser.add_argument('--max-classes', type=int)
+    parser.add_argument('--cache', action='store_true',
+                        help='reuse inspected trees from the on-disk cache')
+    parser.add_argument('--cache-dir', help='cache directory (implies --cache)')
+    parser.add_argument('--diff', metavar='OLD',
+                        help='show only the classes changed since OLD, a JSON snapshot (-o old.json) or a class; '
+                             'obj may be a JSON snapshot too')
+    parser.add_argument('--background', action='store_true',
+                        help='open the window at once and find the classes in a background thread')
+    parser.add_argument('--bundle', action='store_true',
+                        help='draw the edges of classes with many subclasses as shared bundles')
+    parser.add_argument('--profile', metavar='TRACE',
+                        help='show frame times on the canvas and write a Chrome trace to this file on exit')
+    parser.add_argument('--stream', action='store_true',
+                        help='take every class under obj row by row without holding the tree (e.g. "object -o all.json")')
+    parser.add_argument('-s', '--source', action='append', metavar='PATH',
+                        help='parse classes from these files or directories instead of importing them')
+    args = parser.parse_args(argv)
+    if args.output not in (None, '-') and args.format is None:
+        args.format = os.path.splitext(args.output)[1][1:].lower()
+        if args.format not in EXPORTERS:
+            parser.error(f'cannot tell the export format from {args.output!r}, '
+                         f'pass -f {{{",".join(sorted(EXPORTERS))}}}')
+
+    cache = TreeCache(args.cache_dir) if args.cache_dir else args.cache
+    if args.source:
+        root = args.obj.replace(':', '.') if args.obj else None
+        if args.background and args.output is None and not args.diff:
+            obj = TreeLoader(build=lambda: static_tree(args.source, root=root, cache=cache, max_depth=args.max_depth,
+                                                       max_classes=args.max_classes))
+        else:
+            obj = static_tree(args.source, root=root, cache=cache, max_depth=args.max_depth,
+                              max_classes=args.max_classes)
+    elif args.obj and args.obj.endswith('.json'):
+        obj = load_snapshot(args.obj)
+    else:
+        obj = load_object(args.obj or 'tkinter:Frame')
+        if args.stream:
+            obj = ClassStream(obj)
+            if args.output is None:
+                obj = obj.to_tree()
+    if args.diff:
+        old = (load_snapshot(args.diff) if args.diff.endswith('.json') else
+               build_tree(load_object(args.diff), max_depth=args.max_depth, max_classes=args.max_classes, cache=cache))
+        if isinstance(obj, ClassStream):
+            obj = obj.to_tree()
+        elif not isinstance(obj, ClassTree):
+            obj = build_tree(obj, max_depth=args.max_depth, max_classes=args.max_classes, cache=cache)
+        changes, obj = diff_trees(old, obj)
+        for kind in DIFF_KINDS:
+            print(f'{kind}: {sum(1 for value in changes.values() if value == kind)}', file=sys.stderr)
+        if obj is None:
+            return
+    if args.output is None:
+        drawtree(obj, max_depth=args.max_depth, max_classes=args.max_classes, layout=args.layout,
+                 cache=cache, profile=args.profile, bundle=args.bundle, background=args.background)
+        return
+    if isinstance(obj, (ClassTree, ClassStream)):
+        tree = obj
+    else:
+        tree = build_tree(obj, max_depth=args.max_depth, max_classes=args.max_classes, cache=cache)
+    if args.output == '-':
+        export_tree(tree, sys.stdout, args.format or 'svg', layout=args.layout)
+    else:
+        export_tree(tree, args.output, args.format, layout=args.layout)
 
 
 if __name__ == '__main__':
-    drawtree(Frame)
+    main()
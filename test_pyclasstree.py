@@ -0,0 +1,314 @@
+import gc
+import sys
+import textwrap
+import tokenize
+
+import pytest
+
+import pyclasstree as p
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'xdg'))
+
+
+def write_sources(directory, files):
+    for name, source in files.items():
+        path = directory.joinpath(*name.split('/'))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(textwrap.dedent(source))
+
+
+def scan(tmp_path, files, root=None):
+    write_sources(tmp_path, files)
+    return p.static_tree([str(tmp_path)], root=root, workers=1).nodes
+
+
+def make_node(name, row, superclasses=(), dct=()):
+    return {'name': name, 'module': 'm', 'dct': list(dct), 'row': row, 'superclasses': list(superclasses),
+            'ismetaclass': False, 'metaclass': [], 'subclasses': []}
+
+
+def make_tree(nodes):
+    for key, info in nodes.items():
+        for sup in info['superclasses']:
+            if sup != p.OBJECT_KEY:
+                nodes[sup]['subclasses'].append(key)
+    nodes[p.OBJECT_KEY] = p.special_node(object, row=1, superclasses=[])
+    return p.ClassTree.from_nodes(p.OBJECT_KEY, nodes)
+
+
+################################################################################
+# SOURCE SCANNER:
+################################################################################
+PACKAGE = {
+    'pkg/__init__.py': 'from .base import *\n',
+    'pkg/base.py': '''
+        class Foo:
+            def run(self): pass
+        class Meta(type): pass
+    ''',
+}
+
+
+def test_base_named_like_the_class_is_the_imported_one(tmp_path):
+    nodes = scan(tmp_path, {**PACKAGE, 'pkg/sub.py': '''
+        from pkg.base import Foo
+        class Foo(Foo): pass
+    '''})
+    assert nodes['pkg.sub.Foo']['superclasses'] == ['pkg.base.Foo']
+    assert nodes['pkg.base.Foo']['subclasses'] == ['pkg.sub.Foo']
+
+
+def test_class_named_as_its_own_base_is_not_a_cycle(tmp_path):
+    nodes = scan(tmp_path, {'alone.py': 'class Foo(Foo): pass\n'})
+    assert nodes['alone.Foo']['superclasses'] == [p.OBJECT_KEY]
+
+
+def test_cycle_of_wrongly_resolved_names_ends(tmp_path):
+    nodes = scan(tmp_path, {
+        'a.py': 'from b import Y\nclass X(Y): pass\n',
+        'b.py': 'from a import X\nclass Y(X): pass\n',
+    })
+    assert nodes['a.X']['row'] != nodes['b.Y']['row']
+    assert p.OBJECT_KEY in nodes['a.X']['superclasses'] + nodes['b.Y']['superclasses']
+
+
+def test_aliases_and_relative_imports(tmp_path):
+    nodes = scan(tmp_path, {**PACKAGE, 'pkg/rel.py': '''
+        import pkg.base
+        from . import base
+        from .base import Foo as Renamed
+        Alias = pkg.base.Foo
+        class A(Alias): pass
+        class B(base.Foo): pass
+        class C(Renamed): pass
+        class D(A):
+            class Inner(Renamed): pass
+    '''})
+    for key in ('pkg.rel.A', 'pkg.rel.B', 'pkg.rel.C', 'pkg.rel.D.Inner'):
+        assert nodes[key]['superclasses'] == ['pkg.base.Foo'], key
+    assert nodes['pkg.rel.D']['superclasses'] == ['pkg.rel.A']
+
+
+def test_star_reexports_lead_to_the_defining_module(tmp_path):
+    nodes = scan(tmp_path, {**PACKAGE, 'user.py': '''
+        import pkg
+        from pkg import Foo
+        class A(Foo): pass
+        class B(pkg.Foo): pass
+    ''', 'star.py': '''
+        from pkg import *
+        class C(Foo, metaclass=Meta): pass
+    '''})
+    assert nodes['user.A']['superclasses'] == ['pkg.base.Foo']
+    assert nodes['user.B']['superclasses'] == ['pkg.base.Foo']
+    assert nodes['star.C']['superclasses'] == ['pkg.base.Foo']
+    assert nodes['pkg.base.Meta']['ismetaclass']
+
+
+def test_static_tree_matches_the_live_tree(tmp_path, monkeypatch):
+    files = {**PACKAGE, 'pkg/models.py': '''
+        from .base import Foo, Meta
+        class Left(Foo): pass
+        class Right(Foo):
+            def run(self): pass
+        class Both(Left, Right): pass
+        class Typed(metaclass=Meta): pass
+    '''}
+    static = scan(tmp_path, files, root='pkg.base.Foo')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    from pkg import base, models
+    live = p.ClassTree(base.Foo).nodes
+    assert static.keys() == live.keys()
+    for key, info in live.items():
+        for field in ('row', 'superclasses', 'ismetaclass', 'metaclass'):
+            assert static[key][field] == info[field], (key, field)
+        assert sorted(static[key]['subclasses']) == sorted(info['subclasses']), key
+        assert static[key]['dct'] == info['dct'], key
+    assert p.static_tree([str(tmp_path)], root='pkg.models.Typed', workers=1).nodes.keys() == \
+        p.ClassTree(models.Typed).nodes.keys()
+
+
+################################################################################
+# ROWS, EDGES AND LAYOUT:
+################################################################################
+def test_class_depths_is_the_longest_path():
+    class A: pass
+    class B(A): pass
+    class C(B): pass
+    class D(C, A): pass
+    depths = p.class_depths([D])
+    assert [depths[cls] for cls in (object, A, B, C, D)] == [1, 2, 3, 4, 5]
+
+
+def test_class_depths_cuts_cycles():
+    bases = {'o': [], 'a': ['o', 'c'], 'b': ['a'], 'c': ['b'], 'self': ['self', 'o']}
+    depths = p.class_depths(['a', 'self'], bases=bases.__getitem__, root='o')
+    assert depths['self'] == 2
+    assert len({depths['a'], depths['b'], depths['c']}) == 3
+
+
+def test_class_depths_of_a_deep_chain():
+    bases = {0: []}
+    bases.update((i, [i - 1]) for i in range(1, 5000))
+    assert p.class_depths([4999], bases=bases.__getitem__, root=0)[4999] == 5000
+
+
+def test_edge_store():
+    edges = p.EdgeStore()
+    first = edges.add(0, 1)
+    second = edges.add(0, 2)
+    assert edges.add(0, 1) is None
+    assert edges.find(0, 1) == first and edges.find(1, 0) is None
+    assert sorted(edges.down(0)) == [first, second] and edges.up(1) == [first]
+    edges.compact(3)
+    third = edges.add(2, 1)
+    assert sorted(edges.up(1)) == [first, third]
+    edges.remove(first)
+    assert edges.find(0, 1) is None
+    assert edges.down(0) == [second] and edges.up(1) == [third]
+    again = edges.add(0, 1)
+    assert again not in (first, second, third)
+    edges.compact(3)
+    assert sorted(edges.edges(1)) == [third, again]
+
+
+def assert_rows_apart(positions):
+    rows = {}
+    for key, (x, y) in positions.items():
+        rows.setdefault(y, []).append(x)
+    for xs in rows.values():
+        xs.sort()
+        assert all(right - left >= p.NODE_WIDTH for left, right in zip(xs, xs[1:]))
+
+
+def test_layered_layout_update():
+    class Base: pass
+    classes = [type(f'Sub{i}', (Base,), {}) for i in range(6)]
+    tree = p.ClassTree(Base)
+    layout = p.LayeredLayout()
+    positions = layout(tree.nodes)
+    classes.append(type('Late', (classes[0], classes[3]), {}))
+    added, removed, changed = tree.refresh()
+    assert added == {p.class_key(classes[-1])}
+    positions.update(layout.update(tree.nodes, added | removed | changed))
+    assert positions.keys() == tree.nodes.keys()
+    assert_rows_apart(positions)
+    assert positions[p.class_key(classes[-1])][1] > positions[p.class_key(classes[0])][1]
+
+
+################################################################################
+# LIVE TREES:
+################################################################################
+def test_refresh_follows_new_and_collected_classes():
+    class Base: pass
+    class Kept(Base): pass
+    tree = p.ClassTree(Base)
+    assert tree.refresh() == (set(), set(), set())
+
+    class Meta(type): pass
+    class New(Kept, metaclass=Meta): pass
+    added, removed, changed = tree.refresh()
+    assert added == {p.class_key(New), p.class_key(Meta), p.TYPE_KEY}
+    assert changed == {p.class_key(Kept)}
+    assert (p.class_key(New), p.class_key(Kept), 'base') in tree.edges
+
+    key = p.class_key(New)
+    del New
+    gc.collect()
+    added, removed, changed = tree.refresh()
+    assert key in removed and key not in tree.nodes
+    assert all(key not in edge for edge in tree.edges)
+    assert key not in tree.nodes[p.class_key(Kept)]['subclasses']
+
+
+def test_add_nodes_links_references_to_later_nodes():
+    class Base: pass
+    class Sub(Base): pass
+    records = dict(p.ClassTree(Base).nodes)
+    tree = p.TreeLoader(Base).tree()
+    sub, base = p.class_key(Sub), p.class_key(Base)
+    tree.add_nodes([(sub, records[sub])])
+    assert tree.nodes[sub]['superclasses'] == []
+    added, changed = tree.add_nodes([(base, records[base])])
+    assert added == {base} and sub in changed
+    assert tree.nodes[sub]['superclasses'] == [base]
+    assert tree.nodes[base]['subclasses'] == [sub]
+    assert (sub, base, 'base') in tree.edges
+
+
+def test_object_tree_has_every_class():
+    tree = p.ClassTree(object)
+    assert p.class_key(ValueError) in tree.nodes
+    assert tree.nodes.keys() == p.ClassStream(object).to_tree().nodes.keys()
+
+
+def test_keys_do_not_depend_on_discovery_order():
+    base = tokenize.TokenInfo.__bases__[0]
+    assert p.class_key(base) != p.class_key(tokenize.TokenInfo) == 'tokenize.TokenInfo'
+    assert p.class_key(base).startswith('tokenize.TokenInfo#')
+
+
+def test_record_members_of_a_deep_chain():
+    nodes, sup = {}, p.OBJECT_KEY
+    for i in range(sys.getrecursionlimit() + 100):
+        nodes[f'm.C{i}'] = make_node(f'C{i}', i + 2, [sup], [f'f{i}'])
+        sup = f'm.C{i}'
+    tree = make_tree(nodes)
+    members = p.record_members(tree.nodes, sup)
+    assert members['mro'][0] == sup and members['mro'][-1] == p.OBJECT_KEY
+    assert ('f0', 'm.C0') in members['methods']
+
+
+################################################################################
+# DIFF AND CACHE:
+################################################################################
+def test_diff_trees():
+    old = make_tree({'m.A': make_node('A', 2, [p.OBJECT_KEY]),
+                     'm.B': make_node('B', 2, [p.OBJECT_KEY], ['f']),
+                     'm.C': make_node('C', 3, ['m.A']),
+                     'm.Gone': make_node('Gone', 2, [p.OBJECT_KEY])})
+    new = make_tree({'m.A': make_node('A', 2, [p.OBJECT_KEY]),
+                     'm.B': make_node('B', 2, [p.OBJECT_KEY], ['g']),
+                     'm.C': make_node('C', 3, ['m.B']),
+                     'm.D': make_node('D', 4, ['m.C'])})
+    changes, tree = p.diff_trees(old, new)
+    assert changes == {'m.B': 'changed', 'm.C': 'reparented', 'm.D': 'added', 'm.Gone': 'removed'}
+    assert tree.nodes['m.A']['diff'] == 'context'
+    assert tree.nodes['m.C']['superclasses'] == ['m.B', 'm.A']
+    for key, info in tree.nodes.items():
+        assert all(tree.nodes[sup]['row'] < info['row'] for sup in info['superclasses']), key
+    assert p.diff_trees(new, new) == ({}, None)
+
+
+def test_snapshot_round_trip(tmp_path):
+    tree = p.ClassTree(tokenize.TokenInfo, max_depth=1)
+    path = str(tmp_path / 'tree.json')
+    p.export_tree(tree, path)
+    assert p.diff_trees(p.load_snapshot(path), tree) == ({}, None)
+
+
+def test_tree_cache(tmp_path):
+    class Base: pass
+    class Sub(Base): pass
+    cache = p.TreeCache(str(tmp_path))
+    tree = cache.get(Sub)
+    assert cache.load(Sub).nodes == tree.nodes
+    assert cache.load(Sub, max_depth=1) is None
+    (tmp_path / 'junk.tree').write_bytes(b'not zlib')
+    assert cache.load(Sub) is not None
+
+
+def test_tree_cache_misses_new_subclasses(tmp_path, monkeypatch):
+    write_sources(tmp_path, {'cached_mod.py': 'class Base: pass\nclass A(Base): pass\n'})
+    monkeypatch.syspath_prepend(str(tmp_path))
+    import cached_mod
+    cache = p.TreeCache(str(tmp_path / 'cache'))
+    cache.get(cached_mod.Base)
+    assert cache.load(cached_mod.Base) is not None
+    class Late(cached_mod.Base): pass
+    assert cache.load(cached_mod.Base) is None
+    assert p.class_key(Late) in cache.get(cached_mod.Base).nodes
+